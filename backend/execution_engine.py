@@ -1,267 +1,1101 @@
+import io
+import contextlib
 import os
+import json
+import queue
+import atexit
+import hashlib
+import logging
+import logging.handlers
 import time
-import shutil
+import socket
+import struct
+import tarfile
 import tempfile
 import docker
+import orjson
+import shutil
 import signal
+import itertools
+import threading
+from collections import OrderedDict, defaultdict, deque
+from dataclasses import dataclass, field
+from concurrent.futures import ThreadPoolExecutor, wait
+
+# Logging goes through a queue to a background listener thread, so the request path
+# never blocks on a stdout write. Per-call chatter is DEBUG and dropped at the default level.
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+logger.propagate = False
+_log_queue = queue.SimpleQueue()
+_log_handler = logging.StreamHandler()
+_log_handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+_log_listener = logging.handlers.QueueListener(_log_queue, _log_handler)
+logger.addHandler(logging.handlers.QueueHandler(_log_queue))
+_log_listener.start()
+atexit.register(_log_listener.stop)
+
+# Docker API calls are HTTP over a socket and release the GIL, so independent
+# builds and container starts are dispatched concurrently on an executor.
+DOCKER_WORKERS = 16
+
+# Initialize docker client. A single client (and so a single APIClient session) is shared
+# by every thread. Its keep-alive pool holds a connection for every thread that can call
+# Docker at once (request threads, the executor and the event stream); past that, urllib3
+# opens throwaway connections instead of reusing one.
+DOCKER_MAX_POOL_SIZE = int(os.getenv(
+    "DOCKER_MAX_POOL_SIZE", str(int(os.getenv("EXECUTE_WORKERS", "64")) + DOCKER_WORKERS + 1)
+))
+DOCKER_TIMEOUT = int(os.getenv("DOCKER_TIMEOUT", "120"))
+client = docker.from_env(max_pool_size=DOCKER_MAX_POOL_SIZE, timeout=DOCKER_TIMEOUT)
+
+_docker_pool = ThreadPoolExecutor(max_workers=DOCKER_WORKERS, thread_name_prefix="docker")
 
-# Initialize docker client
-client = docker.from_env()
+def _remove_container(container):
+    # Low-level call on the shared APIClient; skips the model wrapper.
+    try:
+        client.api.remove_container(container.id, force=True, v=True)
+    except docker.errors.DockerException:
+        pass
+
+def bulk_cleanup(containers):
+    """
+    Remove containers in parallel. force=True kills and removes in a single API call.
+    """
+    containers = list(containers)
+    if len(containers) == 1:
+        # Run inline so cleanup from inside an executor task can't wait on the executor.
+        _remove_container(containers[0])
+    else:
+        list(_docker_pool.map(_remove_container, containers))
 
-# Global in-memory container pool
-container_pool = {}
-container_pool_gvisor = {}
+# Per-container resource limits. Each warm container is pinned to a rotating set of
+# CONTAINER_CPUS cores (0 disables pinning) so bursts don't have every container
+# contending for every core.
+CONTAINER_CPUS = int(os.getenv("CONTAINER_CPUS", "1"))
+CONTAINER_CPU_LIMIT = float(os.getenv("CONTAINER_CPU_LIMIT", "1"))
+CONTAINER_MEMORY = os.getenv("CONTAINER_MEMORY", "256m")
+CONTAINER_PIDS_LIMIT = int(os.getenv("CONTAINER_PIDS_LIMIT", "128"))
+_cpu_slots = itertools.count()
+_daemon_cpu_count = None
 
-def build_function_image(function_id: int, language: str, code: str) -> str:
+def container_limits() -> dict:
     """
-    Build a Docker image for the function based on its language and code.
+    Resource limit arguments for the next warm container.
     """
-    build_dir = tempfile.mkdtemp(prefix=f"function_{function_id}_")
-    
+    global _daemon_cpu_count
+    limits = {
+        "nano_cpus": int(CONTAINER_CPU_LIMIT * 1_000_000_000),
+        "mem_limit": CONTAINER_MEMORY,
+        "pids_limit": CONTAINER_PIDS_LIMIT,
+    }
+    if CONTAINER_CPUS > 0:
+        if _daemon_cpu_count is None:
+            # Cores on the Docker host, which isn't necessarily this machine.
+            _daemon_cpu_count = client.info().get("NCPU") or os.cpu_count() or 1
+        width = min(CONTAINER_CPUS, _daemon_cpu_count)
+        first = next(_cpu_slots) * width
+        limits["cpuset_cpus"] = ",".join(str((first + i) % _daemon_cpu_count) for i in range(width))
+    return limits
+
+# RAM-backed /tmp for the worker; Python caches stdlib bytecode there (the slim images
+# ship without .pyc files), so imports after the first skip the image layer.
+CONTAINER_TMPFS_SIZE = os.getenv("CONTAINER_TMPFS_SIZE", "64m")
+
+# Host directory holding every function's code, mounted read-only into all runtime
+# containers so a code change is written once instead of copied into each container.
+# It must be on the Docker host; set it empty to copy code into containers instead.
+LAMBDA_FUNCTIONS_DIR = os.getenv("LAMBDA_FUNCTIONS_DIR", "/var/lambda/functions")
+FUNCTIONS_MOUNT = "/functions"
+
+def _init_functions_dir() -> bool:
+    if not LAMBDA_FUNCTIONS_DIR:
+        return False
     try:
-        if language.lower() == "python":
-            code_filename = "function.py"
-            tag = f"function_{function_id}_python:latest"
-            dockerfile_content = (
-                "FROM python:3.8-slim\n"
-                "WORKDIR /app\n"
-                "COPY function.py /app/function.py\n"
-                "CMD [\"python\", \"function.py\"]\n"
-            )
-        elif language.lower() == "javascript":
-            code_filename = "function.js"
-            tag = f"function_{function_id}_javascript:latest"
-            dockerfile_content = (
-                "FROM node:14-slim\n"
-                "WORKDIR /app\n"
-                "COPY function.js /app/function.js\n"
-                "CMD [\"node\", \"function.js\"]\n"
-            )
-        else:
-            raise ValueError("Unsupported language. Only 'python' and 'javascript' are supported.")
+        os.makedirs(LAMBDA_FUNCTIONS_DIR, exist_ok=True)
+        return True
+    except OSError as e:
+        logger.warning("[Update] Cannot use %s for function code (%s); copying code into containers instead.", LAMBDA_FUNCTIONS_DIR, e)
+        return False
 
-        # Write the function code to the appropriate file.
-        code_filepath = os.path.join(build_dir, code_filename)
-        with open(code_filepath, "w") as code_file:
-            code_file.write(code)
+SHARED_CODE = _init_functions_dir()
+# Code revisions kept on disk per function; older ones are deleted once no invocation uses them.
+# With 0 only the revisions currently running are kept.
+PUBLISHED_REVISIONS = max(int(os.getenv("PUBLISHED_REVISIONS", "4")), 0)
 
-        # Write the Dockerfile.
-        dockerfile_path = os.path.join(build_dir, "Dockerfile")
-        with open(dockerfile_path, "w") as df:
-            df.write(dockerfile_content)
+@dataclass
+class CodeRevision:
+    """
+    A published code file: invocations currently running it, and whether it is on disk.
+    """
+    in_flight: int = 0
+    written: bool = False
+    # Held while the file is written, so concurrent publishers wait for it instead of racing.
+    lock: threading.Lock = field(default_factory=threading.Lock)
 
-        # Build the docker image.
-        print(f"Building image '{tag}' for function {function_id}...")
-        image, build_logs = client.images.build(path=build_dir, tag=tag)
-        
-        # Optionally, display build logs.
-        for chunk in build_logs:
-            if "stream" in chunk:
-                print(chunk["stream"].strip())
-                
+# Per function: host path -> CodeRevision, least recently used first.
+_published = defaultdict(OrderedDict)
+_published_lock = threading.Lock()
+
+def runtime_options(language: str) -> dict:
+    """
+    Scratch filesystem, code mount and environment arguments for a warm container of the
+    given language.
+    """
+    options = {
+        "tmpfs": {"/tmp": f"rw,size={CONTAINER_TMPFS_SIZE}"},
+        "environment": lang_spec(language).environment,
+    }
+    if SHARED_CODE:
+        options["binds"] = {LAMBDA_FUNCTIONS_DIR: {"bind": FUNCTIONS_MOUNT, "mode": "ro"}}
+    return options
+
+# gVisor runtime as registered in /etc/docker/daemon.json. A dedicated "runsc-kvm"
+# entry with --platform=kvm and a shared --root boots the sandbox much faster than the
+# default ptrace platform (see README). Without a network the sentry skips netstack setup.
+GVISOR_RUNTIME = os.getenv("GVISOR_RUNTIME", "runsc")
+GVISOR_NETWORK = os.getenv("GVISOR_NETWORK", "none")
+
+# Worker harness scripts copied into the runtime images.
+RUNTIMES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "runtimes")
+
+# Worker responses are framed on stdout as a 4 byte big-endian length plus that many bytes of JSON.
+WORKER_FRAME_HEADER = struct.Struct(">I")
+
+# Cap on captured function output; the worker truncates, the host enforces it.
+MAX_OUTPUT_BYTES = int(os.getenv("MAX_OUTPUT_BYTES", str(1 << 20)))
+
+# Global in-memory container pool, keyed by language. Containers only hold the
+# language runtime, so any warm container can serve any function of that language.
+container_pool = defaultdict(deque)
+container_pool_gvisor = defaultdict(deque)
+
+# One lock per pool so concurrent requests never hand out the same container.
+pool_locks = defaultdict(threading.Lock)
+pool_locks_gvisor = defaultdict(threading.Lock)
+
+# Freeze idle pooled containers (cgroup freezer) so they use no CPU between requests.
+POOL_PAUSE_IDLE = os.getenv("POOL_PAUSE_IDLE", "1") != "0"
+
+# Containers checked out of a pool at once are capped per language. Requests beyond
+# the cap wait for a container to come back instead of each spawning a new one.
+POOL_MAX_IN_FLIGHT = int(os.getenv("POOL_MAX_IN_FLIGHT", os.getenv("POOL_MAX_WARM", "4")))
+pool_slots = defaultdict(lambda: threading.BoundedSemaphore(POOL_MAX_IN_FLIGHT))
+pool_slots_gvisor = defaultdict(lambda: threading.BoundedSemaphore(POOL_MAX_IN_FLIGHT))
+
+# Warm pool sizing. Pools are kept between min and max containers; containers idle
+# for longer than the TTL (seconds) are evicted down to the minimum.
+POOL_MIN_WARM = int(os.getenv("POOL_MIN_WARM", "1"))
+POOL_MAX_WARM = int(os.getenv("POOL_MAX_WARM", "4"))
+POOL_IDLE_TTL = float(os.getenv("POOL_IDLE_TTL", "300"))
+# Containers started per language at server startup, before the first request.
+INITIAL_NUM_WARM = int(os.getenv("INITIAL_NUM_WARM", str(POOL_MIN_WARM)))
+INITIAL_NUM_WARM_GVISOR = int(os.getenv("INITIAL_NUM_WARM_GVISOR", "0"))
+POOL_MAINTENANCE_INTERVAL = float(os.getenv("POOL_MAINTENANCE_INTERVAL", "5"))
+# Upper bound on memory held by idle pooled containers, e.g. "2g". 0 disables the budget.
+POOL_MEMORY_BUDGET = docker.utils.parse_bytes(os.getenv("POOL_MEMORY_BUDGET", "0"))
+
+@dataclass(frozen=True)
+class LangSpec:
+    """
+    Everything that differs between language runtimes.
+    """
+    image: str
+    base: str
+    runner: str
+    cmd: tuple
+    extension: str
+    environment: dict = field(default_factory=dict)
+
+# Generic runtime images, one per language. User code is copied into the warm
+# containers at execution time instead of being baked into a per-function image.
+# Adding a runtime is one entry here plus its worker in runtimes/.
+LANG_SPEC = {
+    "python": LangSpec(
+        image="lambda_runtime_python:latest",
+        base="python:3.8-slim",
+        runner="runner.py",
+        cmd=("python", "-u", "/opt/lambda/runner.py"),
+        extension="py",
+        environment={"PYTHONPYCACHEPREFIX": "/tmp/pycache"},
+    ),
+    "javascript": LangSpec(
+        image="lambda_runtime_js:latest",
+        base="node:14-slim",
+        runner="runner.js",
+        # Node can't dup2, so the shell moves requests to fd 4 and frames to fd 3 and points
+        # fds 0-2 away from the attach stream before starting the worker (see runner.js).
+        cmd=("sh", "-c", "exec node /opt/lambda/runner.js 3>&1 4<&0 </dev/null >>/tmp/.lambda-output 2>&1"),
+        extension="js",
+    ),
+}
+RUNTIME_IMAGES = {language: spec.image for language, spec in LANG_SPEC.items()}
+
+# Image label holding the hash of the build context a runtime image was built from.
+CONTEXT_LABEL = "lambda.context-sha256"
+
+# Runtime image tags known to exist, keyed by language, so /execute skips the daemon round trip.
+_image_cache = {}
+_image_locks = defaultdict(threading.Lock)
+
+def lang_spec(language: str) -> LangSpec:
+    try:
+        return LANG_SPEC[language.lower()]
+    except KeyError:
+        raise ValueError("Unsupported language. Only 'python' and 'javascript' are supported.") from None
+
+def _tar_archive(files: dict) -> bytes:
+    """
+    Pack {name: bytes} into an in-memory tar archive.
+    """
+    buf = io.BytesIO()
+    with tarfile.open(fileobj=buf, mode="w") as tar:
+        for name, data in files.items():
+            info = tarfile.TarInfo(name=name)
+            info.size = len(data)
+            tar.addfile(info, io.BytesIO(data))
+    return buf.getvalue()
+
+def build_runtime_image(language: str) -> str:
+    """
+    Build the generic runtime image for the given language.
+    """
+    spec = lang_spec(language)
+    tag = spec.image
+    runner_filename = spec.runner
+    dockerfile_content = (
+        f"FROM {spec.base}\n"
+        "WORKDIR /app\n"
+        f"COPY {runner_filename} /opt/lambda/{runner_filename}\n"
+        f"CMD {json.dumps(list(spec.cmd))}\n"
+    )
+
+    # The build context (Dockerfile + worker harness) is streamed as an in-memory tar.
+    with open(os.path.join(RUNTIMES_DIR, runner_filename), "rb") as runner:
+        context = _tar_archive({"Dockerfile": dockerfile_content.encode("utf-8"), runner_filename: runner.read()})
+
+    # The tar is deterministic, so its hash identifies the build. An existing image labelled
+    # with the same hash is already up to date and the build is skipped entirely.
+    context_hash = hashlib.sha256(context).hexdigest()
+    try:
+        labels = (client.api.inspect_image(tag).get("Config") or {}).get("Labels") or {}
+    except docker.errors.NotFound:
+        labels = {}
+    if labels.get(CONTEXT_LABEL) == context_hash:
+        logger.info("Runtime image '%s' is up to date.", tag)
+        _image_cache[language.lower()] = tag
         return tag
-    finally:
-        # Clean up temporary build directory.
-        shutil.rmtree(build_dir)
 
-def warm_start_container(function_id: int, image_tag: str):
+    # Build the docker image, reusing layers of the previous image with this tag
+    # (including one pulled from a registry, which the builder won't trust by default).
+    logger.info("Building runtime image '%s'...", tag)
+    build_logs = client.api.build(
+        fileobj=io.BytesIO(context), custom_context=True, tag=tag, cache_from=[tag],
+        labels={CONTEXT_LABEL: context_hash}, rm=True, forcerm=True, decode=True
+    )
+    
+    # The stream must be drained for the build to finish; only format it when debugging.
+    show_logs = logger.isEnabledFor(logging.DEBUG)
+    for chunk in build_logs:
+        if "error" in chunk:
+            raise docker.errors.BuildError(chunk["error"], build_logs)
+        if show_logs and "stream" in chunk:
+            logger.debug("[Build] %s", chunk["stream"].strip())
+            
+    _image_cache[language.lower()] = tag
+    return tag
+
+def build_runtime_images():
+    """
+    Build the runtime images for every supported language concurrently. Called once at server startup.
+    """
+    futures = [_docker_pool.submit(build_runtime_image, language) for language in RUNTIME_IMAGES]
+    for future in futures:
+        future.result()
+
+def cached_runtime_image(language: str):
+    """
+    Return the runtime image tag if it is already known to exist, without calling Docker.
+    """
+    return _image_cache.get(language.lower())
+
+def ensure_runtime_image(language: str) -> str:
+    """
+    Return the runtime image tag for the given language, building it if it is missing.
+    """
+    key = language.lower()
+    if key in _image_cache:
+        return _image_cache[key]
+    tag = lang_spec(language).image
+    # Concurrent first requests for a language wait for one build instead of starting their own.
+    with _image_locks[key]:
+        if key not in _image_cache:
+            try:
+                client.api.inspect_image(tag)
+                _image_cache[key] = tag
+            except docker.errors.NotFound:
+                build_runtime_image(language)
+    return tag
+
+def attach_worker(container):
+    """
+    Attach to the worker's stdin/stdout and keep the socket on the container object.
+    """
+    sock = client.api.attach_socket(
+        container.id, params={"stdin": 1, "stdout": 1, "stderr": 1, "stream": 1}
+    )
+    # Unix socket attachments come back wrapped in a SocketIO; use the raw socket.
+    container._worker_socket = getattr(sock, "_sock", sock)
+    return container
+
+def _recv_exactly(sock, size: int) -> bytes:
+    data = b""
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            raise ConnectionError("Worker connection closed unexpectedly.")
+        data += chunk
+    return data
+
+def call_worker(container, code_path: str, timeout: int, on_log=None) -> dict:
+    """
+    Send one invocation to the container's worker and wait for its response.
+    With on_log, the worker streams output lines, which are passed to it as they arrive.
+    """
+    sock = container._worker_socket
+    deadline = time.monotonic() + timeout
+    request = {"file": code_path, "max_output": MAX_OUTPUT_BYTES}
+    if on_log is not None:
+        request["stream"] = True
+    sock.settimeout(timeout)
+    sock.sendall(orjson.dumps(request) + b"\n")
+
+    # The attach stream is multiplexed: an 8 byte header (stream id, length) per frame.
+    # Frames are appended to bytearrays (no quadratic bytes +=) and the worker's
+    # length-prefixed messages are parsed out of stdout as they complete: log lines
+    # when streaming, then the response. Output is capped per character and the workers
+    # send raw UTF-8 JSON, so escaping grows it at most 6x (\u00XX for a control character).
+    stdout, stderr = bytearray(), bytearray()
+    message_limit = 6 * MAX_OUTPUT_BYTES + 4096
+    response = None
+    while response is None:
+        # The timeout bounds the whole call, not each read, so a chatty function can't outlive it.
+        sock.settimeout(max(deadline - time.monotonic(), 0.001))
+        stream, length = struct.unpack(">BxxxL", _recv_exactly(sock, 8))
+        data = _recv_exactly(sock, length)
+        if stream == 2:
+            stderr += data[:MAX_OUTPUT_BYTES - len(stderr)]
+            continue
+        stdout += data
+        while response is None and len(stdout) >= WORKER_FRAME_HEADER.size:
+            expected = WORKER_FRAME_HEADER.size + WORKER_FRAME_HEADER.unpack_from(stdout)[0]
+            if expected > message_limit:
+                raise ValueError("Worker response exceeded the output limit.")
+            if len(stdout) < expected:
+                break
+            # orjson parses straight from a view of the buffer, without copying the payload out first.
+            message = orjson.loads(memoryview(stdout)[WORKER_FRAME_HEADER.size:expected])
+            del stdout[:expected]
+            if "exit_code" in message:
+                response = message
+            elif on_log is not None:
+                on_log(message["log"])
+
+    if stderr:
+        response["logs"] += stderr.decode("utf-8", errors="replace")
+    return response
+
+# cgroup v2 (systemd and cgroupfs drivers) and cgroup v1 locations of a container's counters.
+CGROUP_V2_DIRS = (
+    "/sys/fs/cgroup/system.slice/docker-{id}.scope",
+    "/sys/fs/cgroup/docker/{id}",
+)
+CGROUP_V1_MEMORY = "/sys/fs/cgroup/memory/docker/{id}/memory.usage_in_bytes"
+CGROUP_V1_CPU = "/sys/fs/cgroup/cpuacct/docker/{id}/cpuacct.usage"
+
+def read_container_stats(container_id: str):
+    """
+    Read CPU time (ns) and memory usage (bytes) straight from the container's cgroup.
+    Much cheaper than the Docker stats API, which is only used when the cgroup isn't readable.
+    """
+    for cgroup_dir in CGROUP_V2_DIRS:
+        cgroup_dir = cgroup_dir.format(id=container_id)
+        try:
+            with open(os.path.join(cgroup_dir, "memory.current")) as f:
+                memory_usage = int(f.read())
+            with open(os.path.join(cgroup_dir, "cpu.stat")) as f:
+                cpu_stat = dict(line.split() for line in f)
+            return int(cpu_stat["usage_usec"]) * 1000, memory_usage
+        except (OSError, KeyError, ValueError):
+            continue
+    try:
+        with open(CGROUP_V1_MEMORY.format(id=container_id)) as f:
+            memory_usage = int(f.read())
+        with open(CGROUP_V1_CPU.format(id=container_id)) as f:
+            cpu_usage = int(f.read())
+        return cpu_usage, memory_usage
+    except (OSError, ValueError):
+        pass
+    # Not visible from here (remote daemon, other cgroup layout): fall back to a single
+    # stats sample; one_shot skips the second sample the API otherwise waits for.
+    try:
+        stats = client.api.stats(container_id, stream=False, one_shot=True)
+        return stats["cpu_stats"]["cpu_usage"]["total_usage"], stats["memory_stats"].get("usage", 0)
+    except (docker.errors.DockerException, KeyError, TypeError):
+        return 0, 0
+
+class PoolStats:
+    """
+    Usage counters for one (runtime, language) pool, used to rank pools for eviction.
+    """
+
+    def __init__(self):
+        self.invocations = 0
+        self.last_used = time.time()
+        self.last_cold_ms = 0.0
+        self.avg_memory = 0.0
+        self._lock = threading.Lock()
+
+    def record_cold_start(self, elapsed_ms: float):
+        with self._lock:
+            self.last_cold_ms = elapsed_ms
+
+    def record_invocation(self, memory_usage: float):
+        with self._lock:
+            self.invocations += 1
+            self.last_used = time.time()
+            if memory_usage:
+                # Exponential moving average, so a single outlier doesn't dominate.
+                self.avg_memory = memory_usage if not self.avg_memory else 0.8 * self.avg_memory + 0.2 * memory_usage
+
+    def memory_estimate(self) -> float:
+        # Until a container reports usage, assume it uses its whole memory limit.
+        return self.avg_memory or docker.utils.parse_bytes(CONTAINER_MEMORY) or 1
+
+    def priority(self, now: float) -> float:
+        frequency = self.invocations / max(now - self.last_used, 1.0)
+        return frequency * max(self.last_cold_ms, 1.0) / self.memory_estimate()
+
+# Keyed by (runtime, language), where runtime is "docker" or "gvisor".
+pool_stats = defaultdict(PoolStats)
+
+def hibernate(container):
+    """
+    Pause an idle container. A container that can't be paused stays in the pool running.
+    """
+    if not POOL_PAUSE_IDLE or getattr(container, "_paused", False):
+        return
+    try:
+        client.api.pause(container.id)
+        container._paused = True
+    except docker.errors.DockerException as e:
+        logger.debug("[Pool] Could not pause %s: %s", container.short_id, e)
+
+def resume(container) -> bool:
+    """
+    Unpause a container checked out of the pool; False if it can't be woken.
+    """
+    if getattr(container, "_paused", False):
+        try:
+            client.api.unpause(container.id)
+        except docker.errors.DockerException as e:
+            logger.warning("[Pool] Could not unpause %s: %s", container.short_id, e)
+            return False
+        container._paused = False
+    return True
+
+def _create_and_start(image_tag: str, environment: dict, host_config: dict):
+    # Low-level create + start: containers.run() would also inspect the new container and
+    # try to pull a missing image from a registry, which these local images never are in.
+    container_id = client.api.create_container(
+        image_tag, stdin_open=True, environment=environment, host_config=client.api.create_host_config(**host_config)
+    )["Id"]
+    try:
+        client.api.start(container_id)
+    except docker.errors.DockerException:
+        client.api.remove_container(container_id, force=True)
+        raise
+    return client.containers.prepare_model({"Id": container_id})
+
+def _run_runtime_container(language: str, image_tag: str, environment: dict = None, **host_config):
+    try:
+        return _create_and_start(image_tag, environment, host_config)
+    except docker.errors.NotFound:
+        # The cached image was removed from the daemon (e.g. by an image prune); rebuild it once.
+        logger.warning("[Pool] Runtime image '%s' is gone; rebuilding it.", image_tag)
+        _image_cache.pop(language.lower(), None)
+        return _create_and_start(ensure_runtime_image(language), environment, host_config)
+
+def warm_start_container(language: str, image_tag: str):
     """
-    Start a warm container for the given function.
+    Start a warm runtime container for the given language.
     """
     try:
-        print(f"[Pool] Warming up container for function {function_id} using image '{image_tag}'...")
-        container = client.containers.run(image_tag, command="tail -f /dev/null", detach=True)
-        return container
+        logger.debug("[Pool] Warming up %s container using image '%s'...", language, image_tag)
+        started = time.time()
+        container = _run_runtime_container(
+            language, image_tag, **container_limits(), **runtime_options(language)
+        )
+        try:
+            attach_worker(container)
+            pool_stats[("docker", language)].record_cold_start((time.time() - started) * 1000)
+            return container
+        except docker.errors.DockerException:
+            bulk_cleanup([container])
+            raise
     except docker.errors.DockerException as de:
-        print(f"[Pool] Error warming container: {str(de)}")
+        logger.warning("[Pool] Error warming container: %s", de)
         raise de
 
-def get_warm_container(function_id: int, image_tag: str):
+def get_warm_container(language: str, image_tag: str, wait_timeout: float = None):
     """
-    Get an available warm container for the given function.
+    Check out a warm container for the given language, waiting up to wait_timeout
+    seconds if POOL_MAX_IN_FLIGHT containers are already checked out.
     """
-    pool = container_pool.get(function_id, [])
-    if pool:
-        container = pool.pop(0)
-        print(f"[Pool] Reusing warm container for function {function_id}.")
-        return container
-    else:
-        return warm_start_container(function_id, image_tag)
+    if not pool_slots[language].acquire(timeout=wait_timeout):
+        raise TimeoutError(f"No {language} container became available within {wait_timeout} seconds.")
+    try:
+        with pool_locks[language]:
+            pool = container_pool[language]
+            # Most recently used end: warmest caches, and the oldest age out by idle TTL.
+            container = pool.pop() if pool else None
+        # Replace the checked-out container in the background rather than on the next request.
+        pool_manager.top_up("docker", language)
+        if container is not None:
+            if resume(container):
+                logger.debug("[Pool] Reusing warm %s container.", language)
+                return container
+            bulk_cleanup([container])
+        return warm_start_container(language, image_tag)
+    except Exception:
+        pool_slots[language].release()
+        raise
 
-def return_container_to_pool(function_id: int, container):
+def add_to_pool(language: str, *containers):
     """
-    Return the container to the pool after use.
+    Add idle containers to the pool.
     """
-    container_pool.setdefault(function_id, []).append(container)
-    print(f"[Pool] Container returned to pool for function {function_id}.")
+    now = time.time()
+    for container in containers:
+        hibernate(container)
+        container._last_used = now
+    with pool_locks[language]:
+        pool = container_pool[language]
+        pool.extend(containers)
+        evicted = [pool.popleft() for _ in range(len(pool) - POOL_MAX_WARM)]
+    bulk_cleanup(evicted)
 
-def update_container_code(container, code: str, language: str):
+def return_container_to_pool(language: str, container):
     """
-    Update the code in the container with new code.
+    Return a checked out container to the pool after use.
     """
-    code_file = "function.py" if language.lower() == "python" else "function.js"
-    
-    with tempfile.NamedTemporaryFile(mode='w', delete=False) as tmp:
-        tmp.write(code)
-        tmp.flush()
-        tmp_path = tmp.name
+    add_to_pool(language, container)
+    pool_slots[language].release()
+    logger.debug("[Pool] Container returned to %s pool.", language)
+
+def discard_container(language: str, container):
+    """
+    Remove a checked out container that can't be reused.
+    """
+    bulk_cleanup([container])
+    pool_slots[language].release()
+
+def code_filename(language: str, code: str) -> str:
+    """
+    Content-addressed file name for a piece of function code.
+    """
+    language = language.lower()
+    extension = lang_spec(language).extension
+    digest = hashlib.sha256(f"{language}\0{code}".encode("utf-8")).hexdigest()[:16]
+    return f"fn_{digest}.{extension}"
+
+def update_container_code(container, files: dict):
+    """
+    Copy {name: contents} files into the container's /app in one upload.
+    Containers remember which files they hold, so unchanged files are not copied again.
+    """
+    code_files = container.__dict__.setdefault("_code_files", set())
+    missing = {name: contents for name, contents in files.items() if name not in code_files}
+    if not missing:
+        return
     
+    # One in-memory tar upload over the API socket; no temp file or docker CLI process.
+    archive = _tar_archive({name: contents.encode("utf-8") for name, contents in missing.items()})
+    logger.debug("[Update] Copying %s into %s", ", ".join(missing), container.short_id)
+    if not client.api.put_archive(container.id, "/app", archive):
+        raise Exception(f"Failed to update code in container {container.short_id}")
+    code_files.update(missing)
+
+def publish_code(function_id: int, code: str, language: str) -> str:
+    """
+    Write the code into the function's directory under LAMBDA_FUNCTIONS_DIR and return its
+    path inside the runtime containers, which all mount that directory read-only.
+    The file stays in use until release_code is called with the returned path.
+    """
+    code_file = code_filename(language, code)
+    host_dir = os.path.join(LAMBDA_FUNCTIONS_DIR, str(function_id))
+    host_path = os.path.join(host_dir, code_file)
+    with _published_lock:
+        revisions = _published[function_id]
+        revision = revisions.get(host_path)
+        if revision is None:
+            revision = revisions[host_path] = CodeRevision()
+        revision.in_flight += 1
+        revisions.move_to_end(host_path)
+        # Unlinked under the lock, so a revision being re-published can't lose its file.
+        older = list(revisions)[:max(len(revisions) - PUBLISHED_REVISIONS, 0)]
+        for stale in [path for path in older if not revisions[path].in_flight]:
+            del revisions[stale]
+            with contextlib.suppress(FileNotFoundError):
+                os.unlink(stale)
     try:
-        # Copy the new code file into the container
-        cmd = f"docker cp {tmp_path} {container.id}:/app/{code_file}"
-        print(f"[Update] Running: {cmd}")
-        result = os.system(cmd)
-        if result != 0:
-            print(f"[Update] Failed to update code in container: {result}")
-            raise Exception(f"Failed to update code in container: {result}")
-    finally:
-        os.unlink(tmp_path)  # Remove temporary file
+        if not revision.written:
+            with revision.lock:
+                if not revision.written:
+                    if not os.path.exists(host_path):
+                        _write_code_file(host_dir, host_path, code)
+                    revision.written = True
+    except BaseException:
+        with _published_lock:
+            revision.in_flight -= 1
+            # Forget the failed revision, so the next call tries the write again.
+            if not revision.in_flight and revisions.get(host_path) is revision:
+                del revisions[host_path]
+        raise
+    return f"{FUNCTIONS_MOUNT}/{function_id}/{code_file}"
+
+def _write_code_file(host_dir: str, host_path: str, code: str):
+    os.makedirs(host_dir, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=host_dir, prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "w") as tmp:
+            tmp.write(code)
+        os.chmod(tmp_path, 0o644)
+        # Atomic: a worker never sees a partially written file.
+        os.replace(tmp_path, host_path)
+    except BaseException:
+        with contextlib.suppress(FileNotFoundError):
+            os.unlink(tmp_path)
+        raise
+
+def release_code(function_id: int, code_path: str):
+    """
+    Mark an invocation of a published code file as finished, so it may be pruned.
+    """
+    if not SHARED_CODE:
+        return
+    host_path = os.path.join(LAMBDA_FUNCTIONS_DIR, str(function_id), os.path.basename(code_path))
+    with _published_lock:
+        revision = _published.get(function_id, {}).get(host_path)
+        if revision is not None and revision.in_flight:
+            revision.in_flight -= 1
+
+def remove_function_code(function_id: int):
+    """
+    Delete a function's published code files.
+    """
+    if not SHARED_CODE:
+        return
+    host_dir = os.path.join(LAMBDA_FUNCTIONS_DIR, str(function_id))
+    with _published_lock:
+        _published.pop(function_id, None)
+    shutil.rmtree(host_dir, ignore_errors=True)
+
+def prepare_code(container, function_id: int, code: str, language: str) -> str:
+    """
+    Make the code visible to the container and return the path the worker should run.
+    """
+    if SHARED_CODE:
+        return publish_code(function_id, code, language)
+    code_file = code_filename(language, code)
+    update_container_code(container, {code_file: code})
+    return f"/app/{code_file}"
 
-def run_function_in_pool(function_id: int, image_tag: str, language: str, timeout: int, code: str = None) -> dict:
+def run_function_in_pool(function_id: int, image_tag: str, language: str, timeout: int, code: str, collect_stats: bool = False, on_log=None) -> dict:
     """
-    Execute function in a Docker container, with the option to update the code.
+    Execute function code in a warm Docker container.
     """
-    container = get_warm_container(function_id, image_tag)
+    language = language.lower()
+    try:
+        container = get_warm_container(language, image_tag, wait_timeout=timeout)
+    except TimeoutError as e:
+        return {"error": str(e)}
     
-    # If code is provided, update it in the container
-    if code is not None:
+    # Copy the code into the runtime container (skipped if it already holds this code)
+    try:
+        code_path = prepare_code(container, function_id, code, language)
+    except Exception as e:
+        logger.warning("[Exec] Failed to update code: %s", e)
+        bulk_cleanup([container])
+        # Retry once in a fresh runtime container; the request keeps its pool slot.
         try:
-            update_container_code(container, code, language)
+            container = warm_start_container(language, image_tag)
+            code_path = prepare_code(container, function_id, code, language)
         except Exception as e:
-            print(f"[Exec] Failed to update code: {str(e)}")
-            try:
-                container.remove(force=True)
-            except:
-                pass
-            # Recreate container with fresh code
-            container = warm_start_container(function_id, image_tag)
+            discard_container(language, container)
+            return {"error": str(e)}
     
     start_time = time.time()
     
     try:
-        if language.lower() == "python":
-            cmd = "python function.py"
-        elif language.lower() == "javascript":
-            cmd = "node function.js"
-        else:
-            raise ValueError("Unsupported language.")
-        
-        print(f"[Exec] Executing command '{cmd}' in Docker container for function {function_id}.")
-        exec_result = container.exec_run(cmd=cmd, demux=True)
-        exit_code = exec_result.exit_code
-        stdout, stderr = exec_result.output if exec_result.output else (b"", b"")
+        logger.debug("[Exec] Invoking worker in Docker container for function %s.", function_id)
+        output = call_worker(container, code_path, timeout, on_log)
         execution_time = time.time() - start_time
         
-        # Query container stats after execution
-        stats = container.stats(stream=False)
-        memory_usage = stats.get("memory_stats", {}).get("usage", 0)
-        cpu_usage = stats.get("cpu_stats", {}).get("cpu_usage", {}).get("total_usage", 0)
+        # Read container resource usage after execution
+        cpu_usage, memory_usage = read_container_stats(container.id) if collect_stats else (0, 0)
         
-        logs = (stdout.decode("utf-8") if stdout else "") + (stderr.decode("utf-8") if stderr else "")
         result = {
-            "logs": logs,
+            "logs": output["logs"],
             "execution_time": execution_time,
-            "exit_code": exit_code,
+            "exit_code": output["exit_code"],
             "cpu_usage": cpu_usage,
             "memory_usage": memory_usage
         }
+    except socket.timeout:
+        # The worker is still busy with the timed-out call, so the container can't be reused.
+        result = {"error": f"Function timed out after {timeout} seconds."}
+        discard_container(language, container)
+        return result
     except Exception as e:
         result = {"error": str(e)}
-        try:
-            container.kill()
-            container.remove()
-        except Exception:
-            pass
+        discard_container(language, container)
         return result
+    finally:
+        release_code(function_id, code_path)
 
-    return_container_to_pool(function_id, container)
+    pool_stats[("docker", language)].record_invocation(memory_usage)
+    return_container_to_pool(language, container)
     return result
 
-def warm_start_container_gvisor(function_id: int, image_tag: str):
+def warm_start_container_gvisor(language: str, image_tag: str):
     """
-    Starts a warm container using gVisor.
+    Starts a warm runtime container using gVisor.
     """
     try:
-        print(f"[Pool] Warming up gVisor container for function {function_id} using image '{image_tag}'...")
-        container = client.containers.run(
+        logger.debug("[Pool] Warming up %s gVisor container using image '%s'...", language, image_tag)
+        started = time.time()
+        container = _run_runtime_container(
+            language,
             image_tag,
-            command="tail -f /dev/null",
-            detach=True,
-            runtime="runsc"  # Use gVisor's runtime
+            runtime=GVISOR_RUNTIME,  # Use gVisor's runtime
+            network_mode=GVISOR_NETWORK,
+            **container_limits(),
+            **runtime_options(language)
         )
-        return container
+        try:
+            attach_worker(container)
+            pool_stats[("gvisor", language)].record_cold_start((time.time() - started) * 1000)
+            return container
+        except docker.errors.DockerException:
+            bulk_cleanup([container])
+            raise
     except docker.errors.DockerException as de:
-        print(f"[Pool] gVisor error while warming container: {str(de)}")
+        logger.warning("[Pool] gVisor error while warming container: %s", de)
         raise de
 
-def get_warm_container_gvisor(function_id: int, image_tag: str):
-    pool = container_pool_gvisor.get(function_id, [])
-    if pool:
-        container = pool.pop(0)
-        print(f"[Pool] Reusing gVisor container for function {function_id}.")
-        return container
-    else:
-        return warm_start_container_gvisor(function_id, image_tag)
+def get_warm_container_gvisor(language: str, image_tag: str, wait_timeout: float = None):
+    if not pool_slots_gvisor[language].acquire(timeout=wait_timeout):
+        raise TimeoutError(f"No {language} gVisor container became available within {wait_timeout} seconds.")
+    try:
+        with pool_locks_gvisor[language]:
+            pool = container_pool_gvisor[language]
+            # Most recently used end: warmest caches, and the oldest age out by idle TTL.
+            container = pool.pop() if pool else None
+        # Replace the checked-out container in the background rather than on the next request.
+        pool_manager.top_up("gvisor", language)
+        if container is not None:
+            if resume(container):
+                logger.debug("[Pool] Reusing %s gVisor container.", language)
+                return container
+            bulk_cleanup([container])
+        return warm_start_container_gvisor(language, image_tag)
+    except Exception:
+        pool_slots_gvisor[language].release()
+        raise
+
+def add_to_pool_gvisor(language: str, *containers):
+    now = time.time()
+    for container in containers:
+        hibernate(container)
+        container._last_used = now
+    with pool_locks_gvisor[language]:
+        pool = container_pool_gvisor[language]
+        pool.extend(containers)
+        evicted = [pool.popleft() for _ in range(len(pool) - POOL_MAX_WARM)]
+    bulk_cleanup(evicted)
 
-def return_container_to_pool_gvisor(function_id: int, container):
-    container_pool_gvisor.setdefault(function_id, []).append(container)
-    print(f"[Pool] gVisor container returned to pool for function {function_id}.")
+def return_container_to_pool_gvisor(language: str, container):
+    add_to_pool_gvisor(language, container)
+    pool_slots_gvisor[language].release()
+    logger.debug("[Pool] gVisor container returned to %s pool.", language)
 
-def run_function_in_gvisor(function_id: int, image_tag: str, language: str, timeout: int, code: str = None) -> dict:
+def discard_container_gvisor(language: str, container):
+    bulk_cleanup([container])
+    pool_slots_gvisor[language].release()
+
+def run_function_in_gvisor(function_id: int, image_tag: str, language: str, timeout: int, code: str, collect_stats: bool = False, on_log=None) -> dict:
     """
-    Execute function in a gVisor container, with the option to update the code.
+    Execute function code in a warm gVisor container.
     """
-    container = get_warm_container_gvisor(function_id, image_tag)
+    language = language.lower()
+    try:
+        container = get_warm_container_gvisor(language, image_tag, wait_timeout=timeout)
+    except TimeoutError as e:
+        return {"error": str(e)}
     
-    # If code is provided, update it in the container
-    if code is not None:
+    # Copy the code into the runtime container (skipped if it already holds this code)
+    try:
+        code_path = prepare_code(container, function_id, code, language)
+    except Exception as e:
+        logger.warning("[Exec] Failed to update code in gVisor container: %s", e)
+        bulk_cleanup([container])
+        # Retry once in a fresh runtime container; the request keeps its pool slot.
         try:
-            update_container_code(container, code, language)
+            container = warm_start_container_gvisor(language, image_tag)
+            code_path = prepare_code(container, function_id, code, language)
         except Exception as e:
-            print(f"[Exec] Failed to update code in gVisor container: {str(e)}")
-            try:
-                container.remove(force=True)
-            except:
-                pass
-            # Recreate container with fresh code
-            container = warm_start_container_gvisor(function_id, image_tag)
+            discard_container_gvisor(language, container)
+            return {"error": str(e)}
     
     start_time = time.time()
     
     try:
-        if language.lower() == "python":
-            cmd = "python function.py"
-        elif language.lower() == "javascript":
-            cmd = "node function.js"
-        else:
-            raise ValueError("Unsupported language.")
-        
-        print(f"[Exec] Executing command '{cmd}' in gVisor container for function {function_id}.")
-        exec_result = container.exec_run(cmd=cmd, demux=True)
-        exit_code = exec_result.exit_code
-        stdout, stderr = exec_result.output if exec_result.output else (b"", b"")
+        logger.debug("[Exec] Invoking worker in gVisor container for function %s.", function_id)
+        output = call_worker(container, code_path, timeout, on_log)
         execution_time = time.time() - start_time
         
-        stats = container.stats(stream=False)
-        memory_usage = stats.get("memory_stats", {}).get("usage", 0)
-        cpu_usage = stats.get("cpu_stats", {}).get("cpu_usage", {}).get("total_usage", 0)
+        cpu_usage, memory_usage = read_container_stats(container.id) if collect_stats else (0, 0)
         
-        logs = (stdout.decode("utf-8") if stdout else "") + (stderr.decode("utf-8") if stderr else "")
         result = {
-            "logs": logs,
+            "logs": output["logs"],
             "execution_time": execution_time,
-            "exit_code": exit_code,
+            "exit_code": output["exit_code"],
             "cpu_usage": cpu_usage,
             "memory_usage": memory_usage
         }
+    except socket.timeout:
+        # The worker is still busy with the timed-out call, so the container can't be reused.
+        result = {"error": f"Function timed out after {timeout} seconds."}
+        discard_container_gvisor(language, container)
+        return result
     except Exception as e:
         result = {"error": str(e)}
-        try:
-            container.kill()
-            container.remove()
-        except Exception:
-            pass
+        discard_container_gvisor(language, container)
         return result
+    finally:
+        release_code(function_id, code_path)
 
-    return_container_to_pool_gvisor(function_id, container)
+    pool_stats[("gvisor", language)].record_invocation(memory_usage)
+    return_container_to_pool_gvisor(language, container)
     return result
+
+def _warm_idle(warm_start, language: str, image_tag: str):
+    # Pause in the warming thread too, so adding the batch to the pool is just a list extend.
+    container = warm_start(language, image_tag)
+    hibernate(container)
+    return container
+
+def prewarm_all(languages, n_each: int, gvisor: bool = False):
+    """
+    Start n_each warm containers for every given language in parallel and add them to the pool.
+    """
+    if gvisor:
+        warm_start, give_back = warm_start_container_gvisor, add_to_pool_gvisor
+    else:
+        warm_start, give_back = warm_start_container, add_to_pool
+    tags = {language: ensure_runtime_image(language) for language in languages}
+    futures = {
+        _docker_pool.submit(_warm_idle, warm_start, language, tag): language
+        for language, tag in tags.items()
+        for _ in range(n_each)
+    }
+    wait(futures)
+    warmed = defaultdict(list)
+    for future, language in futures.items():
+        if future.exception() is None:
+            warmed[language].append(future.result())
+        else:
+            logger.warning("[Pool] Failed to prewarm %s container: %s", language, future.exception())
+    for language, containers in warmed.items():
+        give_back(language, *containers)
+
+class PoolManager:
+    """
+    Background maintainer for the warm pools. Every interval it tops each active pool
+    up to min_warm containers and evicts containers beyond max_warm or idle for longer
+    than idle_ttl. A pool becomes active the first time a request asks for it.
+    With a memory_budget (bytes, 0 for none), idle containers of the least valuable
+    pools are evicted whenever the pools together would exceed it.
+    """
+
+    def __init__(self, min_warm: int, max_warm: int, idle_ttl: float, interval: float, memory_budget: float = 0):
+        self.min_warm = min_warm
+        self.max_warm = max(max_warm, min_warm)
+        self.idle_ttl = idle_ttl
+        self.interval = interval
+        self.memory_budget = memory_budget
+        self._pending = defaultdict(int)
+        self._pending_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._events = None
+        self._events_thread = None
+        self._pools = {
+            "docker": (container_pool, pool_locks, warm_start_container, add_to_pool),
+            "gvisor": (container_pool_gvisor, pool_locks_gvisor, warm_start_container_gvisor, add_to_pool_gvisor),
+        }
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="pool-manager", daemon=True)
+            self._thread.start()
+        if self._events_thread is None:
+            self._events_thread = threading.Thread(target=self._watch_events, name="pool-events", daemon=True)
+            self._events_thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._events is not None:
+            self._events.close()
+
+    def _watch_events(self):
+        # One event stream for the whole process: containers that die while idle in a
+        # pool are dropped immediately instead of failing the next request they serve.
+        while not self._stop.is_set():
+            try:
+                self._events = client.events(decode=True, filters={"type": "container", "event": "die"})
+                for event in self._events:
+                    self.discard(event.get("id"))
+            except Exception as e:
+                if not self._stop.is_set():
+                    logger.warning("[Pool] Event stream interrupted: %s", e)
+                    self._stop.wait(1)
+
+    def discard(self, container_id: str):
+        for runtime, (pool, locks, _, _) in self._pools.items():
+            for language in list(pool.keys()):
+                with locks[language]:
+                    dead = [c for c in pool[language] if c.id == container_id]
+                    for container in dead:
+                        pool[language].remove(container)
+                for container in dead:
+                    logger.info("[Pool] Dropping dead %s %s container %s.", language, runtime, container.short_id)
+                bulk_cleanup(dead)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.maintain()
+            except Exception as e:
+                logger.exception("[Pool] Maintenance pass failed: %s", e)
+
+    def maintain(self):
+        now = time.time()
+        refills = []
+        for runtime, (pool, locks, warm_start, give_back) in self._pools.items():
+            for language in list(pool.keys()):
+                evicted = []
+                with locks[language]:
+                    containers = pool[language]
+                    while len(containers) > self.max_warm:
+                        evicted.append(containers.popleft())
+                    # Oldest returns sit on the left; stop at the first container still in use recently.
+                    while len(containers) > self.min_warm and now - getattr(containers[0], "_last_used", now) > self.idle_ttl:
+                        evicted.append(containers.popleft())
+                    missing = self.min_warm - len(containers)
+                for container in evicted:
+                    logger.debug("[Pool] Evicting idle %s %s container %s.", language, runtime, container.short_id)
+                bulk_cleanup(evicted)
+                refills.append((runtime, language, missing, warm_start, give_back))
+
+        headroom = self._enforce_memory_budget(now) if self.memory_budget else None
+        for runtime, language, missing, warm_start, give_back in refills:
+            if headroom is not None:
+                # Don't warm containers the budget would evict on the next pass.
+                size = pool_stats[(runtime, language)].memory_estimate()
+                missing = min(missing, int(headroom // size))
+                headroom -= max(missing, 0) * size
+            self._refill(runtime, language, missing, warm_start, give_back)
+
+    def _enforce_memory_budget(self, now: float) -> float:
+        """
+        Greedy-dual keep-alive (FaasCache): rank pools by frequency * cold start cost / memory
+        and evict idle containers from the lowest ranked pools until the estimated pooled memory
+        fits in memory_budget. Returns the remaining headroom in bytes.
+        """
+        ranked = []
+        total = 0.0
+        for runtime, (pool, _, _, _) in self._pools.items():
+            for language in list(pool.keys()):
+                stats = pool_stats[(runtime, language)]
+                size = stats.memory_estimate()
+                total += size * len(pool[language])
+                ranked.append((stats.priority(now), runtime, language, size))
+        ranked.sort()
+        for _, runtime, language, size in ranked:
+            if total <= self.memory_budget:
+                break
+            pool, locks = self._pools[runtime][:2]
+            evicted = []
+            with locks[language]:
+                while pool[language] and total > self.memory_budget:
+                    evicted.append(pool[language].popleft())
+                    total -= size
+            if evicted:
+                logger.info("[Pool] Memory budget: evicting %d idle %s %s containers.", len(evicted), language, runtime)
+            bulk_cleanup(evicted)
+        return self.memory_budget - total
+
+    def top_up(self, runtime: str, language: str):
+        """
+        Warm replacements for a pool that just dropped below min_warm, without waiting
+        for the next maintenance pass.
+        """
+        # Looking the pool up creates it, and maintenance would then refill it on every pass.
+        if language not in RUNTIME_IMAGES:
+            raise ValueError(f"No runtime image for language '{language}'.")
+        pool, locks, warm_start, give_back = self._pools[runtime]
+        with locks[language]:
+            missing = self.min_warm - len(pool[language])
+        if missing > 0 and self.memory_budget:
+            # Like maintain(): don't start containers the budget would evict on the next pass.
+            size = pool_stats[(runtime, language)].memory_estimate()
+            missing = min(missing, int(self._budget_headroom() // size))
+        if missing > 0:
+            self._refill(runtime, language, missing, warm_start, give_back)
+
+    def _budget_headroom(self) -> float:
+        """
+        Estimated memory_budget left after the idle pooled containers and those still warming.
+        """
+        with self._pending_lock:
+            pending = dict(self._pending)
+        used = 0.0
+        for runtime, (pool, _, _, _) in self._pools.items():
+            for language in list(pool.keys()):
+                count = len(pool[language]) + pending.get((runtime, language), 0)
+                used += pool_stats[(runtime, language)].memory_estimate() * count
+        return self.memory_budget - used
+
+    def _refill(self, runtime: str, language: str, missing: int, warm_start, give_back):
+        key = (runtime, language)
+        with self._pending_lock:
+            missing -= self._pending[key]
+            if missing <= 0:
+                return
+            self._pending[key] += missing
+        for _ in range(missing):
+            _docker_pool.submit(self._warm_one, key, warm_start, give_back)
+
+    def _warm_one(self, key, warm_start, give_back):
+        runtime, language = key
+        try:
+            give_back(language, warm_start(language, RUNTIME_IMAGES[language]))
+        except Exception as e:
+            logger.warning("[Pool] Failed to refill %s %s pool: %s", language, runtime, e)
+        finally:
+            with self._pending_lock:
+                self._pending[key] -= 1
+
+pool_manager = PoolManager(POOL_MIN_WARM, POOL_MAX_WARM, POOL_IDLE_TTL, POOL_MAINTENANCE_INTERVAL, POOL_MEMORY_BUDGET)
@@ -1,18 +1,53 @@
-from fastapi import FastAPI, HTTPException, Depends, Body, Query
-from pydantic import BaseModel, Field
+from fastapi import FastAPI, HTTPException, Depends, Body, Query, Request, Response
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from pydantic import BaseModel, ConfigDict, Field
 from typing import List, Optional
-from sqlalchemy import create_engine, Column, Integer, String, DateTime, func, Float, case
+from sqlalchemy import event, inspect, insert, select, update, bindparam, Column, Integer, String, DateTime, func, Float
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker, Session
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from datetime import datetime
+from cachetools import TTLCache
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import logging
+import orjson
+import os
 import execution_engine 
 
+# Log level for the app and the execution engine, e.g. LOG_LEVEL=DEBUG to trace pool activity.
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+logging.basicConfig(level=LOG_LEVEL)
+execution_engine.logger.setLevel(LOG_LEVEL)
+logger = logging.getLogger(__name__)
+
 # ----------------------
 # Database Configuration
 # ----------------------
-SQLALCHEMY_DATABASE_URL = "sqlite:///./functions.db"
-engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+SQLALCHEMY_DATABASE_URL = "sqlite+aiosqlite:///./functions.db"
+# Endpoints use an async engine, so database I/O overlaps on the event loop instead of
+# occupying threadpool threads. sqlite3 keeps up to 256 prepared statements per connection
+# and waits up to 30 s for a lock instead of failing with "database is locked".
+engine = create_async_engine(
+    SQLALCHEMY_DATABASE_URL,
+    connect_args={"cached_statements": 256, "timeout": 30},
+    pool_size=20,
+    max_overflow=40,
+)
+AsyncSessionLocal = async_sessionmaker(engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+
+@event.listens_for(engine.sync_engine, "connect")
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    # WAL lets readers run alongside the metrics writer; NORMAL syncs at checkpoints, not every commit.
+    # Pooled connections live for the whole process, so a large page cache and mmap stay hot.
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.execute("PRAGMA mmap_size=268435456")
+    cursor.execute("PRAGMA cache_size=-65536")
+    cursor.close()
+
 Base = declarative_base()
 
 # SQLAlchemy model for Function metadata
@@ -28,16 +63,133 @@ class Function(Base):
 class ExecutionMetrics(Base):
     __tablename__ = "execution_metrics"
     id = Column(Integer, primary_key=True, index=True)
-    function_id = Column(Integer, nullable=False)
+    function_id = Column(Integer, nullable=False, index=True)
     timestamp = Column(DateTime, default=datetime.utcnow)
-    response_time = Column(Float, nullable=False)  # in seconds (float for high precision)
+    response_time_ms = Column(Integer, nullable=False)  # in milliseconds (smaller rows than a float)
     exit_code = Column(Integer, nullable=True)
     error = Column(String, nullable=True)
     cpu_usage = Column(Float, nullable=True)    # Raw CPU usage metric from container
     memory_usage = Column(Float, nullable=True) # Memory usage in bytes
 
-# Create all tables in the database (if they don't exist)
-Base.metadata.create_all(bind=engine)
+# Running totals per function, kept up to date by the metrics writer so /metrics/
+# reads one row per function instead of scanning every execution.
+class FunctionRollup(Base):
+    __tablename__ = "function_rollups"
+    function_id = Column(Integer, primary_key=True)
+    total_executions = Column(Integer, nullable=False, default=0)
+    sum_response_ms = Column(Integer, nullable=False, default=0)
+    sum_cpu_usage = Column(Float, nullable=False, default=0.0)
+    sum_memory_usage = Column(Float, nullable=False, default=0.0)
+    error_count = Column(Integer, nullable=False, default=0)
+
+def migrate_response_time_ms(conn):
+    """
+    Rebuild tables from before response times were stored as integer milliseconds.
+    """
+    inspector = inspect(conn)
+    tables = inspector.get_table_names()
+    if "execution_metrics" in tables and "response_time" in {c["name"] for c in inspector.get_columns("execution_metrics")}:
+        # SQLite can't change a column's type, so copy the rows into a freshly created table.
+        for index in inspector.get_indexes("execution_metrics"):
+            conn.exec_driver_sql(f'DROP INDEX "{index["name"]}"')
+        conn.exec_driver_sql("ALTER TABLE execution_metrics RENAME TO execution_metrics_old")
+        ExecutionMetrics.__table__.create(bind=conn)
+        conn.exec_driver_sql(
+            "INSERT INTO execution_metrics (id, function_id, timestamp, response_time_ms, exit_code, error, cpu_usage, memory_usage) "
+            "SELECT id, function_id, timestamp, CAST(ROUND(response_time * 1000) AS INTEGER), exit_code, error, cpu_usage, memory_usage "
+            "FROM execution_metrics_old"
+        )
+        conn.exec_driver_sql("DROP TABLE execution_metrics_old")
+    if "function_rollups" in tables and "sum_response_time" in {c["name"] for c in inspector.get_columns("function_rollups")}:
+        # Rollups are derived data; dropping them makes init_db recompute them from the rows.
+        FunctionRollup.__table__.drop(bind=conn)
+
+def init_db(conn):
+    migrate_response_time_ms(conn)
+    # Create all tables in the database (if they don't exist)
+    Base.metadata.create_all(bind=conn)
+    # create_all only indexes tables it creates; add the function_id index to an existing table.
+    for index in ExecutionMetrics.__table__.indexes:
+        index.create(bind=conn, checkfirst=True)
+    # Databases from before the rollup table get their totals computed once from the raw rows.
+    if conn.execute(select(FunctionRollup.function_id).limit(1)).first() is None:
+        conn.execute(insert(FunctionRollup).from_select(
+            ["function_id", "total_executions", "sum_response_ms", "sum_cpu_usage", "sum_memory_usage", "error_count"],
+            select(
+                ExecutionMetrics.function_id,
+                func.count(ExecutionMetrics.id),
+                func.coalesce(func.sum(ExecutionMetrics.response_time_ms), 0),
+                func.coalesce(func.sum(ExecutionMetrics.cpu_usage), 0.0),
+                func.coalesce(func.sum(ExecutionMetrics.memory_usage), 0.0),
+                func.count(ExecutionMetrics.error),
+            ).group_by(ExecutionMetrics.function_id),
+        ))
+
+# Function lookup by id, built once; SQLAlchemy reuses its compiled SQL on every call.
+GET_FN_STMT = select(Function).where(Function.id == bindparam("fid"))
+# /execute needs only two columns, fetched as a plain row rather than an ORM object.
+GET_FN_SETTINGS_STMT = select(Function.language, Function.timeout).where(Function.id == bindparam("fid"))
+LIST_FN_STMT = (
+    select(Function.id, Function.name, Function.route, Function.language, Function.timeout)
+    .offset(bindparam("skip"))
+    .limit(bindparam("limit"))
+)
+# /metrics/ reads the rollups as plain column tuples, versioned by the newest execution row.
+METRICS_STMT = (
+    select(
+        FunctionRollup.function_id,
+        FunctionRollup.total_executions,
+        FunctionRollup.sum_response_ms,
+        FunctionRollup.sum_cpu_usage,
+        FunctionRollup.sum_memory_usage,
+        FunctionRollup.error_count,
+    )
+    .where(FunctionRollup.total_executions > 0)
+    .order_by(FunctionRollup.function_id)
+)
+LAST_METRIC_ID_STMT = select(func.max(ExecutionMetrics.id))
+
+# Execution settings of recently invoked functions, so /execute skips the lookup.
+# Entries are dropped on update/delete; the TTL bounds staleness from other writers.
+# Only touched from the event loop, so it needs no lock.
+FN_CACHE = TTLCache(maxsize=1024, ttl=60)
+
+async def get_function_cached(db: AsyncSession, function_id: int) -> Optional[dict]:
+    cached = FN_CACHE.get(function_id)
+    if cached is not None:
+        return cached
+    row = (await db.execute(GET_FN_SETTINGS_STMT, {"fid": function_id})).one_or_none()
+    if row is None:
+        return None
+    cached = {"language": row.language, "timeout": row.timeout}
+    FN_CACHE[function_id] = cached
+    return cached
+
+def invalidate_function_cache(function_id: int):
+    FN_CACHE.pop(function_id, None)
+
+# Validators for conditional GETs, so pollers get a 304 instead of a re-query and re-serialization.
+# The function list is versioned in memory, metrics by their newest row id; the random prefix
+# keeps ETags from another process, from before a restart or from a recreated database from matching.
+ETAG_EPOCH = os.urandom(4).hex()
+functions_version = 0
+
+def mark_functions_changed():
+    global functions_version
+    functions_version += 1
+
+def etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if header is None:
+        return False
+    return header.strip() == "*" or etag in (tag.strip() for tag in header.split(","))
+
+def etag_headers(etag: str) -> dict:
+    # /metrics/ serves JSON or NDJSON from the same URL, so caches must key on Accept.
+    return {"ETag": etag, "Cache-Control": "max-age=2", "Vary": "Accept"}
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers=etag_headers(etag))
 
 # Pydantic schemas
 class FunctionCreate(BaseModel):
@@ -48,8 +200,7 @@ class FunctionCreate(BaseModel):
 
 class FunctionRead(FunctionCreate):
     id: int
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 
 class FunctionExecution(BaseModel):
     code: str = Field(..., example="print('Hello, world!')")
@@ -62,132 +213,387 @@ class MetricsAggregate(BaseModel):
     average_memory_usage: float
     error_count: int
 
+class BatchExecution(FunctionExecution):
+    function_id: int
+    mode: str = Field("docker", description="Execution mode: 'docker' (default) or 'gvisor'")
+
+class BatchExecutionRequest(BaseModel):
+    executions: List[BatchExecution]
+
+class BatchItem(BaseModel):
+    path: str = Field(..., example="/functions/")
+
+class BatchRequest(BaseModel):
+    requests: List[BatchItem]
+
 # Dependency to get DB session for each request
-def get_db():
-    db = SessionLocal()
-    try:
+async def get_db():
+    async with AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
+
+# Execution metrics are queued by /execute and inserted in batches by a background task,
+# so requests don't wait on a SQLite commit each.
+METRICS_BATCH_SIZE = 500
+METRICS_FLUSH_INTERVAL = 0.05  # seconds
+metrics_queue = asyncio.Queue()
+_metrics_writer = None
+
+def rollup_upsert(rows):
+    """
+    One INSERT ... ON CONFLICT DO UPDATE adding a batch's totals to each function's rollup.
+    """
+    totals = {}
+    for row in rows:
+        t = totals.setdefault(row["function_id"], {
+            "function_id": row["function_id"], "total_executions": 0, "sum_response_ms": 0,
+            "sum_cpu_usage": 0.0, "sum_memory_usage": 0.0, "error_count": 0,
+        })
+        t["total_executions"] += 1
+        t["sum_response_ms"] += row["response_time_ms"]
+        t["sum_cpu_usage"] += row["cpu_usage"] or 0.0
+        t["sum_memory_usage"] += row["memory_usage"] or 0.0
+        t["error_count"] += row["error"] is not None
+    stmt = sqlite_insert(FunctionRollup).values(list(totals.values()))
+    return stmt.on_conflict_do_update(
+        index_elements=[FunctionRollup.function_id],
+        set_={
+            column: getattr(FunctionRollup, column) + getattr(stmt.excluded, column)
+            for column in ("total_executions", "sum_response_ms", "sum_cpu_usage", "sum_memory_usage", "error_count")
+        },
+    )
+
+async def write_metrics():
+    stopping = False
+    while not stopping:
+        rows = [await metrics_queue.get()]
+        # Let the rest of the window's executions queue up; one commit covers them all.
+        if rows[0] is not None and metrics_queue.qsize() < METRICS_BATCH_SIZE:
+            await asyncio.sleep(METRICS_FLUSH_INTERVAL)
+        while len(rows) < METRICS_BATCH_SIZE and not metrics_queue.empty():
+            rows.append(metrics_queue.get_nowait())
+        # None is the shutdown marker; write what came before it.
+        if None in rows:
+            stopping = True
+            rows = [row for row in rows if row is not None]
+        if not rows:
+            continue
+        async with AsyncSessionLocal() as db:
+            try:
+                await db.execute(insert(ExecutionMetrics), rows)
+                await db.execute(rollup_upsert(rows))
+                await db.commit()
+            except Exception as e:
+                await db.rollback()
+                logger.warning("Failed to write %d metrics rows: %s", len(rows), e)
 
 # FastAPI app initialization
-app = FastAPI(title="Serverless Function API with Docker & gVisor Execution and Metrics")
+# orjson serializes responses (large function logs in particular) much faster than the stdlib encoder.
+app = FastAPI(
+    title="Serverless Function API with Docker & gVisor Execution and Metrics",
+    default_response_class=ORJSONResponse,
+)
+
+# Threads for blocking execution calls; sized for concurrent requests, which mostly wait on
+# Docker and the function itself, rather than for the CPU count like asyncio's default.
+EXECUTE_WORKERS = int(os.getenv("EXECUTE_WORKERS", "64"))
+
+# Image checks and builds get threads of their own (one per language can run at a time), and
+# concurrent requests for a language await the same task, so a slow build holds no execute threads.
+build_pool = ThreadPoolExecutor(max_workers=len(execution_engine.LANG_SPEC), thread_name_prefix="build")
+_image_builds = {}
+
+async def runtime_image(language: str) -> str:
+    image_tag = execution_engine.cached_runtime_image(language)
+    if image_tag is not None:
+        return image_tag
+    key = language.lower()
+    task = _image_builds.get(key)
+    if task is None:
+        task = asyncio.get_running_loop().run_in_executor(build_pool, execution_engine.ensure_runtime_image, language)
+        _image_builds[key] = task
+        task.add_done_callback(lambda _: _image_builds.pop(key, None))
+    # A disconnecting client must not cancel the build other requests are waiting on.
+    return await asyncio.shield(task)
+
+@app.on_event("startup")
+async def create_tables():
+    async with engine.begin() as conn:
+        await conn.run_sync(init_db)
+
+@app.on_event("startup")
+async def configure_executor():
+    asyncio.get_running_loop().set_default_executor(
+        ThreadPoolExecutor(max_workers=EXECUTE_WORKERS, thread_name_prefix="execute")
+    )
+
+@app.on_event("startup")
+def build_runtime_images():
+    # Build the generic runtime images once so /execute only has to copy code in.
+    execution_engine.build_runtime_images()
+    # Warm the pools before the first request; gVisor pools only on request, since not every host has runsc.
+    if execution_engine.INITIAL_NUM_WARM > 0:
+        execution_engine.prewarm_all(execution_engine.RUNTIME_IMAGES, execution_engine.INITIAL_NUM_WARM)
+    if execution_engine.INITIAL_NUM_WARM_GVISOR > 0:
+        execution_engine.prewarm_all(execution_engine.RUNTIME_IMAGES, execution_engine.INITIAL_NUM_WARM_GVISOR, gvisor=True)
+    execution_engine.pool_manager.start()
+
+@app.on_event("startup")
+async def start_metrics_writer():
+    global _metrics_writer
+    _metrics_writer = asyncio.create_task(write_metrics(), name="metrics-writer")
+
+@app.on_event("shutdown")
+def stop_pool_manager():
+    execution_engine.pool_manager.stop()
+    build_pool.shutdown(wait=False)
+
+@app.on_event("shutdown")
+async def flush_metrics():
+    if _metrics_writer is not None:
+        metrics_queue.put_nowait(None)
+        try:
+            await asyncio.wait_for(_metrics_writer, timeout=5)
+        except asyncio.TimeoutError:
+            logger.warning("Metrics writer did not finish within 5 s; queued rows are lost")
+
+@app.on_event("shutdown")
+async def dispose_engine():
+    await engine.dispose()
 
 @app.get("/")
-def read_root():
+async def read_root():
     return {"message": "Welcome to the Serverless Function API"}
 
 # CRUD Endpoints for Function metadata
 @app.post("/functions/", response_model=FunctionRead)
-def create_function(function: FunctionCreate, db: Session = Depends(get_db)):
-    db_function = Function(**function.dict())
-    db.add(db_function)
-    db.commit()
-    db.refresh(db_function)
+async def create_function(function: FunctionCreate, db: AsyncSession = Depends(get_db)):
+    # INSERT ... RETURNING gives back the new row directly, skipping the unit-of-work flush.
+    db_function = (await db.execute(
+        insert(Function).values(**function.model_dump()).returning(Function)
+    )).scalar_one()
+    await db.commit()
+    mark_functions_changed()
     return db_function
 
+async def function_rows(db: AsyncSession, skip: int = 0, limit: int = 100) -> list:
+    rows = (await db.execute(LIST_FN_STMT, {"skip": skip, "limit": limit})).mappings().all()
+    return [dict(row) for row in rows]
+
 @app.get("/functions/", response_model=List[FunctionRead])
-def read_functions(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    functions = db.query(Function).offset(skip).limit(limit).all()
-    return functions
+async def read_functions(request: Request, skip: int = 0, limit: int = 100, db: AsyncSession = Depends(get_db)):
+    etag = f'W/"{ETAG_EPOCH}-{functions_version}-{skip}-{limit}"'
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    # List endpoints return their rows as dicts in an ORJSONResponse, which FastAPI sends as is
+    # instead of validating every row against response_model (kept for the OpenAPI schema).
+    return ORJSONResponse(await function_rows(db, skip, limit), headers=etag_headers(etag))
 
 @app.get("/functions/{function_id}", response_model=FunctionRead)
-def read_function(function_id: int, db: Session = Depends(get_db)):
-    db_function = db.query(Function).filter(Function.id == function_id).first()
+async def read_function(function_id: int, db: AsyncSession = Depends(get_db)):
+    db_function = (await db.execute(GET_FN_STMT, {"fid": function_id})).scalar_one_or_none()
     if db_function is None:
         raise HTTPException(status_code=404, detail="Function not found")
     return db_function
 
 @app.put("/functions/{function_id}", response_model=FunctionRead)
-def update_function(function_id: int, function_update: FunctionCreate, db: Session = Depends(get_db)):
-    db_function = db.query(Function).filter(Function.id == function_id).first()
+async def update_function(function_id: int, function_update: FunctionCreate, db: AsyncSession = Depends(get_db)):
+    # One UPDATE ... RETURNING instead of loading the row, setting attributes and reloading it.
+    db_function = (await db.execute(
+        update(Function)
+        .where(Function.id == function_id)
+        .values(**function_update.model_dump(exclude_unset=True))
+        .returning(Function)
+    )).scalar_one_or_none()
     if db_function is None:
         raise HTTPException(status_code=404, detail="Function not found")
-    for key, value in function_update.dict().items():
-        setattr(db_function, key, value)
-    db.commit()
-    db.refresh(db_function)
+    await db.commit()
+    invalidate_function_cache(function_id)
+    mark_functions_changed()
     return db_function
 
 @app.delete("/functions/{function_id}")
-def delete_function(function_id: int, db: Session = Depends(get_db)):
-    db_function = db.query(Function).filter(Function.id == function_id).first()
+async def delete_function(function_id: int, db: AsyncSession = Depends(get_db)):
+    db_function = (await db.execute(GET_FN_STMT, {"fid": function_id})).scalar_one_or_none()
     if db_function is None:
         raise HTTPException(status_code=404, detail="Function not found")
-    db.delete(db_function)
-    db.commit()
+    await db.delete(db_function)
+    await db.commit()
+    invalidate_function_cache(function_id)
+    mark_functions_changed()
+    await asyncio.to_thread(execution_engine.remove_function_code, function_id)
     return {"detail": f"Function id {function_id} deleted."}
 
 # Enhanced /execute Endpoint with Metrics Collection including resource metrics
 
+def record_metrics(function_id: int, result: dict):
+    metrics_queue.put_nowait({
+        "function_id": function_id,
+        "timestamp": datetime.utcnow(),
+        "response_time_ms": round(float(result.get("execution_time", 0)) * 1000),
+        "exit_code": result.get("exit_code"),
+        "error": result.get("error"),
+        "cpu_usage": float(result.get("cpu_usage", 0)),
+        "memory_usage": float(result.get("memory_usage", 0)),
+    })
+
+async def stream_execution(function_id: int, run, *args):
+    """
+    NDJSON body of a streamed execution: {"log": ...} lines as the function prints,
+    then one {"result": ...} line.
+    """
+    loop = asyncio.get_running_loop()
+    lines = asyncio.Queue()
+    def on_log(text):
+        loop.call_soon_threadsafe(lines.put_nowait, text)
+    task = asyncio.ensure_future(asyncio.to_thread(run, *args, collect_stats=True, on_log=on_log))
+    def finished(task):
+        # Runs on the loop after every queued log line; metrics are kept even if the client left.
+        if not task.cancelled() and task.exception() is None:
+            record_metrics(function_id, task.result())
+        lines.put_nowait(None)
+    task.add_done_callback(finished)
+    while (text := await lines.get()) is not None:
+        yield orjson.dumps({"log": text}) + b"\n"
+    try:
+        result = task.result()
+    except Exception as e:
+        result = {"error": str(e)}
+    yield orjson.dumps({"result": result}) + b"\n"
+
+@app.post("/warm/{function_id}", status_code=202)
+async def warm_function(
+    function_id: int,
+    mode: str = Query("docker", description="Execution mode: 'docker' (default) or 'gvisor'"),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Get a container ready for the function's language ahead of an /execute call.
+    """
+    db_function = await get_function_cached(db, function_id)
+    if db_function is None:
+        raise HTTPException(status_code=404, detail="Function metadata not found.")
+    try:
+        await runtime_image(db_function["language"])
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error preparing runtime image: {str(e)}")
+    runtime = "gvisor" if mode.lower() == "gvisor" else "docker"
+    # Only queues the container starts on the engine's pool, so this returns right away.
+    execution_engine.pool_manager.top_up(runtime, db_function["language"].lower())
+    return {"function_id": function_id, "mode": runtime, "status": "warming"}
+
+def execution_runner(mode: str):
+    return execution_engine.run_function_in_gvisor if mode.lower() == "gvisor" else execution_engine.run_function_in_pool
+
+async def run_batch_execution(execution: BatchExecution, settings: Optional[dict]) -> dict:
+    """
+    One entry of /execute/batch; failures are reported in the entry instead of failing the batch.
+    """
+    entry = {"function_id": execution.function_id, "mode": execution.mode}
+    if settings is None:
+        return {**entry, "error": "Function metadata not found."}
+    try:
+        image_tag = await runtime_image(settings["language"])
+    except Exception as e:
+        return {**entry, "error": f"Error preparing runtime image: {str(e)}"}
+    try:
+        result = await asyncio.to_thread(
+            execution_runner(execution.mode), execution.function_id, image_tag,
+            settings["language"], settings["timeout"], execution.code, collect_stats=True
+        )
+    except Exception as e:
+        return {**entry, "error": str(e)}
+    record_metrics(execution.function_id, result)
+    return {**entry, **result}
+
+# Declared before /execute/{function_id}, which would otherwise match "batch".
+@app.post("/execute/batch")
+async def execute_batch(batch_request: BatchExecutionRequest, db: AsyncSession = Depends(get_db)):
+    # Look the functions up one at a time (one session), then run them all at once.
+    settings = [await get_function_cached(db, e.function_id) for e in batch_request.executions]
+    results = await asyncio.gather(*(
+        run_batch_execution(execution, fn) for execution, fn in zip(batch_request.executions, settings)
+    ))
+    return ORJSONResponse(results)
+
 @app.post("/execute/{function_id}")
-def execute_function(
+async def execute_function(
     function_id: int,
     execution: FunctionExecution,
+    request: Request,
     mode: str = Query("docker", description="Execution mode: 'docker' (default) or 'gvisor'"),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
-    db_function = db.query(Function).filter(Function.id == function_id).first()
+    db_function = await get_function_cached(db, function_id)
     if db_function is None:
         raise HTTPException(status_code=404, detail="Function metadata not found.")
 
     try:
-        image_tag = execution_engine.build_function_image(function_id, db_function.language, execution.code)
+        image_tag = await runtime_image(db_function["language"])
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error building Docker image: {str(e)}")
-    
-    if mode.lower() == "gvisor":
-        # Pass the code to the execution function
-        result = execution_engine.run_function_in_gvisor(function_id, image_tag, db_function.language, db_function.timeout, execution.code)
-    else:
-        # Pass the code to the execution function
-        result = execution_engine.run_function_in_pool(function_id, image_tag, db_function.language, db_function.timeout, execution.code)
-    
-    response_time = float(result.get("execution_time", 0))
-    exit_code = result.get("exit_code")
-    error_msg = result.get("error")
-    cpu_usage = float(result.get("cpu_usage", 0))
-    memory_usage = float(result.get("memory_usage", 0))
-    
-    metrics_record = ExecutionMetrics(
-        function_id=function_id,
-        response_time=response_time,
-        exit_code=exit_code,
-        error=error_msg,
-        cpu_usage=cpu_usage,
-        memory_usage=memory_usage
-    )
-    db.add(metrics_record)
-    db.commit()
+        raise HTTPException(status_code=500, detail=f"Error preparing runtime image: {str(e)}")
     
+    # Run the blocking execution in a worker thread so concurrent requests overlap.
+    run = execution_runner(mode)
+    args = (function_id, image_tag, db_function["language"], db_function["timeout"], execution.code)
+    # Clients asking for NDJSON see the function's output while it runs.
+    if "application/x-ndjson" in request.headers.get("accept", ""):
+        return StreamingResponse(stream_execution(function_id, run, *args), media_type="application/x-ndjson")
+    result = await asyncio.to_thread(run, *args, collect_stats=True)
+    record_metrics(function_id, result)
     return result
 
 # Metrics Aggregation Endpoint with resource metrics
+def metrics_row(function_id, total, sum_ms, sum_cpu, sum_memory, errors) -> dict:
+    return {
+        "function_id": function_id,
+        "total_executions": total,
+        "average_response_time": sum_ms / total / 1000,
+        "average_cpu_usage": sum_cpu / total,
+        "average_memory_usage": sum_memory / total,
+        "error_count": errors,
+    }
+
+async def metrics_rows(db: AsyncSession) -> list:
+    # Plain column tuples instead of ORM objects, turned straight into response dicts.
+    rows = (await db.execute(METRICS_STMT)).all()
+    return [metrics_row(*row) for row in rows]
+
+async def stream_metrics():
+    # The request's session may be closed before the body is sent, so the stream opens its own.
+    async with AsyncSessionLocal() as db:
+        result = await db.stream(METRICS_STMT.execution_options(yield_per=256))
+        async for row in result:
+            yield orjson.dumps(metrics_row(*row)) + b"\n"
+
 @app.get("/metrics/", response_model=List[MetricsAggregate])
-def aggregate_metrics(db: Session = Depends(get_db)):
-    aggregates = (
-        db.query(
-            ExecutionMetrics.function_id,
-            func.count(ExecutionMetrics.id).label("total_executions"),
-            func.avg(ExecutionMetrics.response_time).label("average_response_time"),
-            func.avg(ExecutionMetrics.cpu_usage).label("average_cpu_usage"),
-            func.avg(ExecutionMetrics.memory_usage).label("average_memory_usage"),
-            func.sum(case((ExecutionMetrics.error != None, 1), else_=0)).label("error_count")
-        )
-        .group_by(ExecutionMetrics.function_id)
-        .all()
-    )
-    
-    result = [
-        MetricsAggregate(
-            function_id=agg.function_id,
-            total_executions=agg.total_executions,
-            average_response_time=float(agg.average_response_time or 0),
-            average_cpu_usage=float(agg.average_cpu_usage or 0),
-            average_memory_usage=float(agg.average_memory_usage or 0),
-            error_count=agg.error_count or 0
-        )
-        for agg in aggregates
-    ]
-    return result
+async def aggregate_metrics(request: Request, db: AsyncSession = Depends(get_db)):
+    # Clients asking for NDJSON get one object per line, encoded and sent as rows are read.
+    ndjson = "application/x-ndjson" in request.headers.get("accept", "")
+    # Rollups change only together with new execution rows, so the newest row id versions them.
+    last_id = (await db.execute(LAST_METRIC_ID_STMT)).scalar()
+    etag = f'W/"{ETAG_EPOCH}-m-{last_id or 0}{"-nd" if ndjson else ""}"'
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    if ndjson:
+        return StreamingResponse(stream_metrics(), media_type="application/x-ndjson", headers=etag_headers(etag))
+    return ORJSONResponse(await metrics_rows(db), headers=etag_headers(etag))
+
+# Read-only endpoints a client may fetch together through /batch/.
+BATCH_READS = {
+    "/functions/": function_rows,
+    "/metrics/": metrics_rows,
+}
+
+async def batch_read(path: str):
+    # Each read gets its own session; one AsyncSession can't run queries concurrently.
+    async with AsyncSessionLocal() as db:
+        return await BATCH_READS[path](db)
 
+@app.post("/batch/")
+async def batch(batch_request: BatchRequest):
+    paths = [item.path for item in batch_request.requests]
+    unknown = [path for path in paths if path not in BATCH_READS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unsupported batch paths: {', '.join(unknown)}")
+    results = await asyncio.gather(*(batch_read(path) for path in paths))
+    return ORJSONResponse(dict(zip(paths, results)))
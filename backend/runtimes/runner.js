@@ -0,0 +1,207 @@
+// Long-lived worker process for the JavaScript runtime image.
+//
+// Reads one JSON request per line from stdin, runs the referenced function file
+// in a fresh VM context and, once every timer the function scheduled has fired,
+// writes the result to stdout as JSON prefixed with its 4 byte big-endian length.
+// Compiled scripts are kept per file so repeat runs skip parsing.
+// Captured output is capped at the request's max_output characters. Requests with
+// "stream" set also get each line of output as a {"log": ...} frame before the result.
+//
+// The image starts the worker with requests on fd 4 and frames on fd 3; fd 0 is
+// /dev/null and fds 1 and 2 append to a capture file. The function's process.stdout
+// and process.stderr write into its output, and anything written to fds 1 and 2
+// directly (child processes) is read back from the capture file after each run, so
+// nothing user code prints can end up in the frame stream.
+const fs = require("fs");
+const path = require("path");
+const readline = require("readline");
+const util = require("util");
+const vm = require("vm");
+
+const EXIT = Symbol("exit");
+const TRUNCATED = "\n[output truncated]\n";
+const REQUESTS_FD = 4;
+const FRAMES_FD = 3;
+const CAPTURE_PATH = "/tmp/.lambda-output";
+
+const capture = fs.openSync(CAPTURE_PATH, "r");
+fs.unlinkSync(CAPTURE_PATH);
+fs.ftruncateSync(1, 0);
+
+const MAX_SCRIPTS = 64;
+const scripts = new Map();
+
+let current = null;
+
+function send(message) {
+  const payload = Buffer.from(JSON.stringify(message), "utf8");
+  const header = Buffer.alloc(4);
+  header.writeUInt32BE(payload.length);
+  fs.writeSync(FRAMES_FD, Buffer.concat([header, payload]));
+}
+
+function load(file) {
+  const key = file + ":" + fs.statSync(file).mtimeMs;
+  let script = scripts.get(key);
+  if (!script) {
+    script = new vm.Script(fs.readFileSync(file, "utf8"), { filename: file });
+    if (scripts.size >= MAX_SCRIPTS) scripts.delete(scripts.keys().next().value);
+    scripts.set(key, script);
+  }
+  return script;
+}
+
+function run(file, maxOutput, stream, done) {
+  const output = [];
+  const timers = new Set();
+  let outputSize = 0;
+  let truncated = false;
+  let exitCode = 0;
+  let finished = false;
+
+  const append = (text) => {
+    const room = maxOutput - outputSize;
+    if (text.length > room) {
+      truncated = true;
+      text = text.slice(0, Math.max(room, 0));
+    }
+    if (text) {
+      output.push(text);
+      outputSize += text.length;
+      if (stream) send({ log: text });
+    }
+  };
+  const write = (...args) => append(util.format(...args) + "\n");
+
+  // Stand-ins for process.stdout/stderr that write into the output instead of fd 1.
+  const outputStream = () => ({
+    isTTY: false,
+    write(chunk, encoding, callback) {
+      append(typeof chunk === "string" ? chunk : Buffer.from(chunk).toString("utf8"));
+      const cb = typeof encoding === "function" ? encoding : callback;
+      if (cb) process.nextTick(cb);
+      return true;
+    },
+  });
+
+  // Output that reached fds 1 and 2 without going through the sandbox.
+  function drainCapture() {
+    const size = fs.fstatSync(capture).size;
+    if (size === 0) return;
+    // Output is capped by UTF-16 unit and a unit is at most 3 bytes of UTF-8.
+    const data = Buffer.alloc(Math.min(size, 3 * maxOutput));
+    const read = fs.readSync(capture, data, 0, data.length, 0);
+    fs.ftruncateSync(1, 0);
+    append(data.toString("utf8", 0, read));
+    if (size > read) truncated = true;
+  }
+
+  function finish() {
+    if (finished) return;
+    finished = true;
+    current = null;
+    timers.forEach((timer) => clearTimeout(timer));
+    drainCapture();
+    done({ logs: output.join("") + (truncated ? TRUNCATED : ""), exit_code: exitCode });
+  }
+
+  function fail(err) {
+    if (err !== EXIT) {
+      write(err && err.stack ? err.stack : String(err));
+      exitCode = 1;
+    }
+    finish();
+  }
+
+  function settle() {
+    setImmediate(() => {
+      if (timers.size === 0) finish();
+    });
+  }
+
+  function guarded(fn, args, timer, repeat) {
+    return () => {
+      if (finished) return;
+      if (!repeat) timers.delete(timer.ref);
+      try {
+        fn(...args);
+      } catch (err) {
+        return fail(err);
+      }
+      settle();
+    };
+  }
+
+  function schedule(set, fn, ms, args, repeat) {
+    const timer = {};
+    timer.ref = set(guarded(fn, args, timer, repeat), ms);
+    timers.add(timer.ref);
+    return timer.ref;
+  }
+
+  function cancel(timer) {
+    clearTimeout(timer);
+    timers.delete(timer);
+    settle();
+  }
+
+  const sandboxProcess = Object.create(process);
+  // Own properties: process.stdout/stderr are getters, so plain assignment would be ignored.
+  Object.defineProperty(sandboxProcess, "stdout", { value: outputStream() });
+  Object.defineProperty(sandboxProcess, "stderr", { value: outputStream() });
+  sandboxProcess.exit = (code) => {
+    exitCode = code || 0;
+    throw EXIT;
+  };
+
+  const sandbox = {
+    console: { log: write, info: write, warn: write, error: write, debug: write },
+    process: sandboxProcess,
+    require: (id) => require(id.startsWith(".") ? path.resolve(path.dirname(file), id) : id),
+    module: { exports: {} },
+    __filename: file,
+    __dirname: path.dirname(file),
+    Buffer,
+    URL,
+    TextEncoder,
+    TextDecoder,
+    setTimeout: (fn, ms, ...args) => schedule(setTimeout, fn, ms, args, false),
+    setInterval: (fn, ms, ...args) => schedule(setInterval, fn, ms, args, true),
+    setImmediate: (fn, ...args) => schedule(setTimeout, fn, 0, args, false),
+    clearTimeout: cancel,
+    clearInterval: cancel,
+    clearImmediate: cancel,
+  };
+  sandbox.exports = sandbox.module.exports;
+
+  current = { fail };
+  try {
+    load(file).runInNewContext(sandbox);
+  } catch (err) {
+    return fail(err);
+  }
+  settle();
+}
+
+process.on("uncaughtException", (err) => current && current.fail(err));
+process.on("unhandledRejection", (err) => current && current.fail(err));
+
+const queue = [];
+let busy = false;
+
+function next() {
+  if (busy || queue.length === 0) return;
+  busy = true;
+  const request = queue.shift();
+  run(request.file, request.max_output || 1 << 20, Boolean(request.stream), (result) => {
+    send(result);
+    busy = false;
+    next();
+  });
+}
+
+readline.createInterface({ input: fs.createReadStream(null, { fd: REQUESTS_FD }) }).on("line", (line) => {
+  if (!line.trim()) return;
+  queue.push(JSON.parse(line));
+  next();
+});
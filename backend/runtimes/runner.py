@@ -0,0 +1,152 @@
+"""
+Long-lived worker process for the Python runtime image.
+
+Reads one JSON request per line from stdin, runs the referenced function file
+in a fresh namespace and writes the result to stdout as JSON prefixed with its
+4 byte big-endian length. The interpreter is started once per container, so
+each invocation only pays for the function itself, and repeat runs of the same
+file reuse its compiled code object. Captured output is capped at the
+request's max_output characters. Requests with "stream" set also get each
+completed line of output as a {"log": ...} frame before the result.
+
+Requests and frames travel on private copies of fds 0 and 1. User code gets
+/dev/null as stdin, and fds 1 and 2 point at a capture file, so output that
+bypasses sys.stdout (subprocesses, C extensions, os.write) is added to the
+invocation's logs instead of corrupting the frame stream.
+"""
+import contextlib
+import functools
+import io
+import json
+import os
+import struct
+import sys
+import traceback
+
+TRUNCATED = "\n[output truncated]\n"
+CAPTURE_PATH = "/tmp/.lambda-output"
+
+
+def send(stdout, message):
+    # Raw UTF-8 rather than \u escapes, so a character takes at most 6 bytes (a control
+    # character's \u00XX); an escaped emoji would take 12. Lone surrogates become U+FFFD.
+    payload = json.dumps(message, ensure_ascii=False).encode("utf-8", errors="replace")
+    stdout.write(struct.pack(">I", len(payload)) + payload)
+    stdout.flush()
+
+
+class CappedOutput(io.TextIOBase):
+    """Text stream that keeps at most `limit` characters and drops the rest.
+
+    With `emit`, kept text is also passed on a line at a time as it is written.
+    """
+
+    def __init__(self, limit, emit=None):
+        self.limit = limit
+        self.parts = []
+        self.size = 0
+        self.truncated = False
+        self.emit = emit
+        self.pending = ""
+
+    def writable(self):
+        return True
+
+    def write(self, text):
+        written = len(text)
+        room = self.limit - self.size
+        if written > room:
+            self.truncated = True
+            text = text[:max(room, 0)]
+        if text:
+            self.parts.append(text)
+            self.size += len(text)
+            if self.emit is not None:
+                self.pending += text
+                end = self.pending.rfind("\n") + 1
+                if end:
+                    self.emit(self.pending[:end])
+                    self.pending = self.pending[end:]
+        return written
+
+    def flush_pending(self):
+        if self.emit is not None and self.pending:
+            self.emit(self.pending)
+            self.pending = ""
+
+    def getvalue(self):
+        return "".join(self.parts) + (TRUNCATED if self.truncated else "")
+
+
+@functools.lru_cache(maxsize=64)
+def load(path, mtime_ns):
+    with open(path) as source_file:
+        return compile(source_file.read(), path, "exec")
+
+
+def isolate_stdio():
+    """Move the protocol off fds 0-2 and return (requests, frames, capture fd)."""
+    requests = os.fdopen(os.dup(0), "r")
+    frames = os.fdopen(os.dup(1), "wb")
+    # The worker's own errors still go to the container's stderr.
+    sys.stderr = os.fdopen(os.dup(2), "w")
+    devnull = os.open(os.devnull, os.O_RDONLY)
+    os.dup2(devnull, 0)
+    os.close(devnull)
+    sys.stdin = open(os.devnull)
+    # O_APPEND, so writers sharing the descriptor never overwrite each other after a truncate.
+    capture = os.open(CAPTURE_PATH, os.O_RDWR | os.O_CREAT | os.O_TRUNC | os.O_APPEND, 0o600)
+    os.unlink(CAPTURE_PATH)
+    os.dup2(capture, 1)
+    os.dup2(capture, 2)
+    return requests, frames, capture
+
+
+def drain_capture(capture, output):
+    """Move what was written to fds 1 and 2 during the run into output."""
+    with contextlib.suppress(Exception):
+        sys.__stdout__.flush()
+    size = os.fstat(capture).st_size
+    if size:
+        # Output is capped by character and a character is at most 4 bytes of UTF-8.
+        data = os.pread(capture, min(size, 4 * output.limit), 0)
+        os.ftruncate(capture, 0)
+        output.write(data.decode("utf-8", errors="replace"))
+        if size > len(data):
+            output.truncated = True
+
+
+def run(path, max_output, emit=None, capture=None):
+    output = CappedOutput(max_output, emit)
+    exit_code = 0
+    with contextlib.redirect_stdout(output), contextlib.redirect_stderr(output):
+        try:
+            code = load(path, os.stat(path).st_mtime_ns)
+            exec(code, {"__name__": "__main__", "__file__": path})
+        except SystemExit as e:
+            if isinstance(e.code, int):
+                exit_code = e.code
+            elif e.code is not None:
+                print(e.code, file=sys.stderr)
+                exit_code = 1
+        except BaseException:
+            traceback.print_exc()
+            exit_code = 1
+    if capture is not None:
+        drain_capture(capture, output)
+    output.flush_pending()
+    return {"logs": output.getvalue(), "exit_code": exit_code}
+
+
+def main():
+    requests, frames, capture = isolate_stdio()
+    for line in requests:
+        if not line.strip():
+            continue
+        request = json.loads(line)
+        emit = (lambda text: send(frames, {"log": text})) if request.get("stream") else None
+        send(frames, run(request["file"], request.get("max_output", 1 << 20), emit, capture))
+
+
+if __name__ == "__main__":
+    main()
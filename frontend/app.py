@@ -1,13 +1,214 @@
 import streamlit as st
+import orjson
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
 import pandas as pd
 import plotly.express as px
+import plotly.graph_objects as go
+from plotly.subplots import make_subplots
 import json
+import time
 from datetime import datetime
 
 # API Base URL - Change this to match your FastAPI deployment
 API_BASE_URL = "http://localhost:8000"
 
+# Timeout (seconds) for API calls; executions also allow for the function's timeout, once for
+# waiting on a pooled container and once for running
+REQUEST_TIMEOUT = 5
+
+# Request and response bodies go through orjson, which is faster than the stdlib json requests uses
+JSON_HEADERS = {"Content-Type": "application/json"}
+
+def parse_json(response):
+    return orjson.loads(response.content)
+
+# Transient backend failures are retried with backoff (0.3 s, 0.6 s, ...) instead of surfacing as an error.
+# Connection failures are retried for every method, since nothing reached the backend; 502/503/504 and
+# read timeouts only for reads. A PUT or DELETE that went through behind a failing proxy would otherwise
+# be sent again and report a 404 for a change that was made, and an execution would run twice.
+RETRY = Retry(
+    total=3,
+    backoff_factor=0.3,
+    status_forcelist=[502, 503, 504],
+    allowed_methods=frozenset({"GET", "HEAD"}),
+    raise_on_status=False,
+)
+
+@st.cache_resource
+def get_http():
+    """
+    Shared HTTP session, so connections to the API are kept alive across reruns.
+    """
+    session = requests.Session()
+    # Don't look up proxy variables and ~/.netrc again on every request; the API is addressed directly.
+    session.trust_env = False
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16, max_retries=RETRY)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+@st.cache_resource
+def get_warm_pool():
+    """
+    Small shared pool for fire-and-forget warm-up pings, so they never hold up a rerun.
+    """
+    return ThreadPoolExecutor(max_workers=2, thread_name_prefix="warm")
+
+# Seconds before a warmed pool is pinged again; matches the backend's default POOL_IDLE_TTL,
+# after which an idle container may have been evicted
+WARM_INTERVAL = 300
+
+def prewarm(function_id, mode):
+    """
+    Ask the backend to ready a container for the function, at most once per WARM_INTERVAL
+    and mode, so one is warm by the time the user clicks Execute. The ping's response is
+    ignored; if the container is gone anyway, the execution just starts cold.
+    """
+    now = time.monotonic()
+    warmed = st.session_state.setdefault("warmed_at", {})
+    # Forget pings old enough that the container may be gone, so the dict stays small.
+    for key in [key for key, at in warmed.items() if now - at >= WARM_INTERVAL]:
+        del warmed[key]
+    key = (function_id, mode)
+    if key in warmed:
+        return
+    warmed[key] = now
+    get_warm_pool().submit(get_http().post, f"{API_BASE_URL}/warm/{function_id}?mode={mode}", timeout=2)
+
+@st.cache_resource
+def get_validators():
+    """
+    Last ETag and parsed body per URL, shared by all sessions for conditional GETs.
+    """
+    return {}
+
+def conditional_get(url):
+    # Revalidate instead of re-downloading: an unchanged resource comes back as an empty 304.
+    validators = get_validators()
+    cached = validators.get(url)
+    headers = {"If-None-Match": cached[0]} if cached else {}
+    response = get_http().get(url, headers=headers, timeout=REQUEST_TIMEOUT)
+    if response.status_code == 304 and cached:
+        return cached[1]
+    response.raise_for_status()
+    payload = parse_json(response)
+    etag = response.headers.get("ETag")
+    if etag:
+        validators[url] = (etag, payload)
+    return payload
+
+@st.cache_data(ttl=5)
+def fetch_functions():
+    """
+    Function list shared by every page and tab; cleared after changes so they show up at once.
+    """
+    return conditional_get(f"{API_BASE_URL}/functions/")
+
+@st.cache_data(ttl=5)
+def fetch_dashboard():
+    """
+    Function list and per-function aggregates for the Metrics page, in one batch request.
+    Cleared after executions and function changes.
+    """
+    response = get_http().post(
+        f"{API_BASE_URL}/batch/",
+        data=orjson.dumps({"requests": [{"path": "/functions/"}, {"path": "/metrics/"}]}),
+        headers=JSON_HEADERS,
+        timeout=REQUEST_TIMEOUT,
+    )
+    response.raise_for_status()
+    return parse_json(response)
+
+# Known response schemas, so frames are built without per-column dtype inference
+FUNCTION_COLUMNS = ["id", "name", "route", "language", "timeout"]
+FUNCTION_DTYPES = {"id": "int32", "timeout": "int32"}
+METRICS_COLUMNS = [
+    "function_id", "function_name", "total_executions", "average_response_time",
+    "average_cpu_usage", "average_memory_usage", "error_count",
+]
+# Arrow-backed, so st.dataframe ships the columns as they are instead of converting them each render
+METRICS_DTYPES = {
+    "function_id": "int32[pyarrow]", "function_name": "string[pyarrow]",
+    "total_executions": "int32[pyarrow]", "average_response_time": "float32[pyarrow]",
+    "average_cpu_usage": "float64[pyarrow]", "average_memory_usage": "float64[pyarrow]",
+    "error_count": "int32[pyarrow]",
+}
+
+# Example code the Execute page starts from, per language
+DEFAULT_CODE = {
+    "python": """# Python function example
+import time
+import random
+
+# Simulate some work
+time.sleep(0.5)
+
+# Generate some sample data
+data = [random.randint(1, 100) for _ in range(10)]
+total = sum(data)
+average = total / len(data)
+
+print(f"Data: {data}")
+print(f"Sum: {total}")
+print(f"Average: {average}")
+
+# Return some resource info
+import os
+import psutil
+process = psutil.Process(os.getpid())
+print(f"Memory usage: {process.memory_info().rss / 1024 / 1024:.2f} MB")
+""",
+    "javascript": """// JavaScript function example
+const start = Date.now();
+
+// Simulate some work
+setTimeout(() => {
+  // Generate some sample data
+  const data = Array.from({length: 10}, () => Math.floor(Math.random() * 100));
+  const total = data.reduce((a, b) => a + b, 0);
+  const average = total / data.length;
+
+  console.log(`Data: ${JSON.stringify(data)}`);
+  console.log(`Sum: ${total}`);
+  console.log(`Average: ${average}`);
+
+  // Execution time
+  console.log(`Execution time: ${Date.now() - start}ms`);
+
+  // Exit the timeout
+}, 500);
+""",
+}
+
+def functions_frame(functions):
+    return pd.DataFrame.from_records(functions, columns=FUNCTION_COLUMNS).astype(FUNCTION_DTYPES)
+
+# Fixed column widths, so the grid lays out without measuring every row
+FUNCTION_COLUMN_CONFIG = {
+    "id": st.column_config.NumberColumn("ID", width="small"),
+    "name": st.column_config.TextColumn("Name", width="medium"),
+    "route": st.column_config.TextColumn("Route", width="large"),
+    "language": st.column_config.TextColumn("Language", width="small"),
+    "timeout": st.column_config.NumberColumn("Timeout (s)", width="small"),
+}
+
+def show_functions(functions):
+    """
+    Functions table shown on the Home and Manage Functions pages; the fixed height keeps the grid
+    virtualized, so only the visible rows are drawn however many functions there are.
+    """
+    st.dataframe(
+        functions_frame(functions),
+        column_config=FUNCTION_COLUMN_CONFIG,
+        height=300,
+        hide_index=True,
+        use_container_width=True,
+    )
+
 # Set page config
 st.set_page_config(
     page_title="Serverless Function Platform",
@@ -40,17 +241,18 @@ def home_page():
     
     # Show a sample of the latest functions
     try:
-        functions = requests.get(f"{API_BASE_URL}/functions/").json()
+        functions = fetch_functions()
         
         if functions:
             st.subheader("Recent Functions")
-            df = pd.DataFrame(functions)
-            st.dataframe(df)
+            show_functions(functions)
         else:
             st.info("No functions created yet. Head to the 'Manage Functions' page to create one!")
     except Exception as e:
         st.error(f"Error connecting to the backend: {e}")
 
+# Pages with widgets are fragments: interacting with them reruns only the page, not the whole app.
+@st.fragment
 def manage_functions_page():
     st.title("Manage Functions")
     
@@ -77,365 +279,412 @@ def manage_functions_page():
                             "language": language,
                             "timeout": timeout
                         }
-                        response = requests.post(f"{API_BASE_URL}/functions/", json=data)
+                        response = get_http().post(f"{API_BASE_URL}/functions/", data=orjson.dumps(data), headers=JSON_HEADERS, timeout=REQUEST_TIMEOUT)
                         if response.status_code == 200:
+                            fetch_functions.clear()
+                            fetch_dashboard.clear()
                             st.success(f"Function '{name}' created successfully!")
-                            st.json(response.json())
+                            st.json(parse_json(response))
                         else:
                             st.error(f"Error creating function: {response.text}")
                     except Exception as e:
                         st.error(f"Error connecting to backend: {e}")
     
+    # The other tabs share one fetch, made after a create so the list includes it
+    functions, load_error = [], None
+    try:
+        functions = fetch_functions()
+    except requests.HTTPError as e:
+        load_error = f"Error fetching functions: {e.response.text}"
+    except Exception as e:
+        load_error = f"Error connecting to backend: {e}"
+    # Built once so option labels and the selected function are dict lookups, not list scans
+    by_id = {f["id"]: f for f in functions}
+    
     with tab2:
         st.header("View Functions")
-        try:
-            response = requests.get(f"{API_BASE_URL}/functions/")
-            if response.status_code == 200:
-                functions = response.json()
-                if functions:
-                    df = pd.DataFrame(functions)
-                    st.dataframe(df)
-                    
-                    # Show details of a selected function
-                    selected_function_id = st.selectbox(
-                        "Select a function to view details", 
-                        options=[f["id"] for f in functions],
-                        format_func=lambda x: next((f["name"] for f in functions if f["id"] == x), str(x))
-                    )
-                    
-                    if selected_function_id:
-                        selected_function = next((f for f in functions if f["id"] == selected_function_id), None)
-                        if selected_function:
-                            st.subheader(f"Function Details: {selected_function['name']}")
-                            st.json(selected_function)
-                else:
-                    st.info("No functions found. Create one in the 'Create' tab.")
-            else:
-                st.error(f"Error fetching functions: {response.text}")
-        except Exception as e:
-            st.error(f"Error connecting to backend: {e}")
+        if load_error:
+            st.error(load_error)
+        elif functions:
+            show_functions(functions)
+            
+            # Show details of a selected function
+            selected_function_id = st.selectbox(
+                "Select a function to view details", 
+                options=list(by_id),
+                format_func=lambda x: by_id[x]["name"] if x in by_id else str(x)
+            )
+            
+            if selected_function_id:
+                selected_function = by_id.get(selected_function_id)
+                if selected_function:
+                    st.subheader(f"Function Details: {selected_function['name']}")
+                    st.json(selected_function)
+        else:
+            st.info("No functions found. Create one in the 'Create' tab.")
     
     with tab3:
         st.header("Update Function")
-        try:
-            response = requests.get(f"{API_BASE_URL}/functions/")
-            if response.status_code == 200:
-                functions = response.json()
-                if functions:
-                    selected_function_id = st.selectbox(
-                        "Select a function to update", 
-                        options=[f["id"] for f in functions],
-                        format_func=lambda x: next((f["name"] for f in functions if f["id"] == x), str(x)),
-                        key="update_function_select"
-                    )
-                    
-                    if selected_function_id:
-                        selected_function = next((f for f in functions if f["id"] == selected_function_id), None)
-                        
-                        with st.form("update_function_form"):
-                            name = st.text_input("Function Name", value=selected_function["name"])
-                            route = st.text_input("Route", value=selected_function["route"])
-                            language = st.selectbox("Language", ["python", "javascript"], index=0 if selected_function["language"] == "python" else 1)
-                            timeout = st.number_input("Timeout (seconds)", min_value=1, value=selected_function["timeout"])
-                            
-                            submitted = st.form_submit_button("Update Function")
-                            if submitted:
-                                if not name or not route:
-                                    st.error("Name and Route are required fields.")
-                                else:
-                                    try:
-                                        data = {
-                                            "name": name,
-                                            "route": route,
-                                            "language": language,
-                                            "timeout": timeout
-                                        }
-                                        response = requests.put(f"{API_BASE_URL}/functions/{selected_function_id}", json=data)
-                                        if response.status_code == 200:
-                                            st.success(f"Function '{name}' updated successfully!")
-                                            st.json(response.json())
-                                        else:
-                                            st.error(f"Error updating function: {response.text}")
-                                    except Exception as e:
-                                        st.error(f"Error connecting to backend: {e}")
-                else:
-                    st.info("No functions found. Create one in the 'Create' tab.")
-            else:
-                st.error(f"Error fetching functions: {response.text}")
-        except Exception as e:
-            st.error(f"Error connecting to backend: {e}")
-    
-    with tab4:
-        st.header("Delete Function")
-        try:
-            response = requests.get(f"{API_BASE_URL}/functions/")
-            if response.status_code == 200:
-                functions = response.json()
-                if functions:
-                    selected_function_id = st.selectbox(
-                        "Select a function to delete", 
-                        options=[f["id"] for f in functions],
-                        format_func=lambda x: next((f"{f['name']} (ID: {f['id']})" for f in functions if f["id"] == x), str(x)),
-                        key="delete_function_select"
-                    )
+        if load_error:
+            st.error(load_error)
+        elif functions:
+            selected_function_id = st.selectbox(
+                "Select a function to update", 
+                options=list(by_id),
+                format_func=lambda x: by_id[x]["name"] if x in by_id else str(x),
+                key="update_function_select"
+            )
+            
+            if selected_function_id:
+                selected_function = by_id.get(selected_function_id)
+                
+                with st.form("update_function_form"):
+                    name = st.text_input("Function Name", value=selected_function["name"])
+                    route = st.text_input("Route", value=selected_function["route"])
+                    language = st.selectbox("Language", ["python", "javascript"], index=0 if selected_function["language"] == "python" else 1)
+                    timeout = st.number_input("Timeout (seconds)", min_value=1, value=selected_function["timeout"])
                     
-                    if selected_function_id:
-                        selected_function = next((f for f in functions if f["id"] == selected_function_id), None)
-                        st.write(f"You are about to delete: **{selected_function['name']}**")
-                        
-                        if st.button("Delete Function", key="delete_button"):
+                    submitted = st.form_submit_button("Update Function")
+                    if submitted:
+                        if not name or not route:
+                            st.error("Name and Route are required fields.")
+                        else:
                             try:
-                                response = requests.delete(f"{API_BASE_URL}/functions/{selected_function_id}")
+                                data = {
+                                    "name": name,
+                                    "route": route,
+                                    "language": language,
+                                    "timeout": timeout
+                                }
+                                response = get_http().put(f"{API_BASE_URL}/functions/{selected_function_id}", data=orjson.dumps(data), headers=JSON_HEADERS, timeout=REQUEST_TIMEOUT)
                                 if response.status_code == 200:
-                                    st.success(f"Function deleted successfully!")
-                                    st.rerun()
+                                    fetch_functions.clear()
+                                    fetch_dashboard.clear()
+                                    st.success(f"Function '{name}' updated successfully!")
+                                    st.json(parse_json(response))
                                 else:
-                                    st.error(f"Error deleting function: {response.text}")
+                                    st.error(f"Error updating function: {response.text}")
                             except Exception as e:
                                 st.error(f"Error connecting to backend: {e}")
-                else:
-                    st.info("No functions found. Create one in the 'Create' tab.")
-            else:
-                st.error(f"Error fetching functions: {response.text}")
-        except Exception as e:
-            st.error(f"Error connecting to backend: {e}")
-
-def execute_function_page():
-    st.title("Execute Function")
+        else:
+            st.info("No functions found. Create one in the 'Create' tab.")
     
-    try:
-        response = requests.get(f"{API_BASE_URL}/functions/")
-        if response.status_code == 200:
-            functions = response.json()
-            if functions:
-                col1, col2 = st.columns(2)
-                
-                with col1:
-                    selected_function_id = st.selectbox(
-                        "Select a function to execute", 
-                        options=[f["id"] for f in functions],
-                        format_func=lambda x: next((f"{f['name']} ({f['language']})" for f in functions if f["id"] == x), str(x))
-                    )
-                
-                with col2:
-                    execution_mode = st.radio("Execution Mode", ["docker", "gvisor"], help="Docker is faster, gVisor provides better security isolation")
+    with tab4:
+        st.header("Delete Function")
+        if load_error:
+            st.error(load_error)
+        elif functions:
+            selected_function_id = st.selectbox(
+                "Select a function to delete", 
+                options=list(by_id),
+                format_func=lambda x: f"{by_id[x]['name']} (ID: {x})" if x in by_id else str(x),
+                key="delete_function_select"
+            )
+            
+            if selected_function_id:
+                selected_function = by_id.get(selected_function_id)
+                st.write(f"You are about to delete: **{selected_function['name']}**")
                 
-                if selected_function_id:
-                    selected_function = next((f for f in functions if f["id"] == selected_function_id), None)
-                    
-                    language = selected_function["language"]
-                    
-                    # Default code examples based on language
-                    default_code = ""
-                    if language == "python":
-                        default_code = """# Python function example
-import time
-import random
+                if st.button("Delete Function", key="delete_button"):
+                    try:
+                        response = get_http().delete(f"{API_BASE_URL}/functions/{selected_function_id}", timeout=REQUEST_TIMEOUT)
+                        if response.status_code == 200:
+                            fetch_functions.clear()
+                            fetch_dashboard.clear()
+                            # Rerun just this page so every tab drops the deleted function, with
+                            # the delete selectbox reset; a toast outlives the rerun.
+                            st.session_state.pop("delete_function_select", None)
+                            st.toast("Function deleted successfully!")
+                            st.rerun(scope="fragment")
+                        else:
+                            st.error(f"Error deleting function: {response.text}")
+                    except Exception as e:
+                        st.error(f"Error connecting to backend: {e}")
+        else:
+            st.info("No functions found. Create one in the 'Create' tab.")
 
-# Simulate some work
-time.sleep(0.5)
+# Executions are streamed as NDJSON so output shows up while the function runs
+STREAM_HEADERS = {**JSON_HEADERS, "Accept": "application/x-ndjson"}
 
-# Generate some sample data
-data = [random.randint(1, 100) for _ in range(10)]
-total = sum(data)
-average = total / len(data)
+# Seconds between redraws of the live log while streaming
+LOG_REFRESH_INTERVAL = 0.1
 
-print(f"Data: {data}")
-print(f"Sum: {total}")
-print(f"Average: {average}")
+def read_execution_stream(response, placeholder):
+    """
+    Show {"log": ...} lines in the placeholder as they arrive and return the final result.
+    A stream that ends without one (backend crash, dropped connection) comes back as an error.
+    """
+    logs, result, drawn = [], None, 0.0
+    with response:
+        for line in response.iter_lines():
+            if not line:
+                continue
+            message = orjson.loads(line)
+            if "result" in message:
+                result = message["result"]
+                break
+            logs.append(message["log"])
+            if time.monotonic() - drawn >= LOG_REFRESH_INTERVAL:
+                placeholder.code("".join(logs), language=None)
+                drawn = time.monotonic()
+    placeholder.empty()
+    if result is None:
+        return {"logs": "".join(logs), "error": "Execution stream ended without a result."}
+    return result
 
-# Return some resource info
-import os
-import psutil
-process = psutil.Process(os.getpid())
-print(f"Memory usage: {process.memory_info().rss / 1024 / 1024:.2f} MB")
-"""
-                    elif language == "javascript":
-                        default_code = """// JavaScript function example
-const start = Date.now();
+# (divisor, unit) pairs from largest to smallest, for _fmt
+_UNITS_CPU = ((1e9, "Gcycles"), (1e6, "Mcycles"), (1e3, "Kcycles"), (1, "cycles"))
+_UNITS_MEMORY = ((1e9, "GB"), (1e6, "MB"), (1e3, "KB"), (1, "B"))
 
-// Simulate some work
-setTimeout(() => {
-  // Generate some sample data
-  const data = Array.from({length: 10}, () => Math.floor(Math.random() * 100));
-  const total = data.reduce((a, b) => a + b, 0);
-  const average = total / data.length;
+def _fmt(value, units):
+    """
+    Format value in the largest unit it reaches; values below 1 use the smallest.
+    """
+    divisor, unit = next(((d, u) for d, u in units if value >= d), units[-1])
+    return f"{value / divisor:.2f} {unit}"
 
-  console.log(`Data: ${JSON.stringify(data)}`);
-  console.log(`Sum: ${total}`);
-  console.log(`Average: ${average}`);
-  
-  // Execution time
-  console.log(`Execution time: ${Date.now() - start}ms`);
-  
-  // Exit the timeout
-}, 500);
-"""
-                    
-                    code = st.text_area("Function Code", height=300, value=default_code)
+def _render_metrics(result, cols):
+    """
+    Execution time, CPU and memory of one result, one metric per column.
+    """
+    with cols[0]:
+        st.metric("Execution Time", f"{result.get('execution_time', 0):.4f} sec")
+    
+    with cols[1]:
+        st.metric("CPU Usage", _fmt(result.get('cpu_usage', 0), _UNITS_CPU))
+    
+    with cols[2]:
+        st.metric("Memory Usage", _fmt(result.get('memory_usage', 0), _UNITS_MEMORY))
+
+def _render_result(result, key):
+    output_tab, metrics_tab = st.tabs(["Output", "Execution Metrics"])
+    
+    with output_tab:
+        st.subheader("Function Output")
+        logs = result.get("logs", "")
+        if logs:
+            st.text_area("Logs", value=logs, height=200, disabled=True, key=f"logs_{key}")
+        else:
+            st.info("No output from function.")
+    
+    with metrics_tab:
+        st.subheader("Execution Metrics")
+        _render_metrics(result, st.columns(3))
+        
+        st.metric("Exit Code", result.get('exit_code', 'N/A'))
+        
+        if "error" in result:
+            st.error(f"Error during execution: {result['error']}")
+
+@st.fragment
+def execute_function_page():
+    st.title("Execute Function")
+    
+    try:
+        functions = fetch_functions()
+        by_id = {f["id"]: f for f in functions}
+        if functions:
+            col1, col2 = st.columns(2)
+            
+            with col1:
+                selected_ids = st.multiselect(
+                    "Select functions to execute", 
+                    options=list(by_id),
+                    default=list(by_id)[:1],
+                    format_func=lambda x: f"{by_id[x]['name']} ({by_id[x]['language']})" if x in by_id else str(x),
+                    help="Several functions are run concurrently in one request"
+                )
+            
+            with col2:
+                # Outside the form, so picking a mode warms that runtime's pool right away
+                execution_mode = st.radio(
+                    "Execution Mode", ["docker", "gvisor"],
+                    help="Docker is faster, gVisor provides better security isolation"
+                )
+            
+            selected_ids = [fid for fid in selected_ids if fid in by_id]
+            for fid in selected_ids:
+                prewarm(fid, execution_mode)
+            
+            submitted = False
+            if selected_ids:
+                # Code only reaches the script on submit, so typing doesn't rerun the page
+                with st.form("execute_form"):
+                    # One editor per function, each starting from its language's example; the code is
+                    # read back from session_state on submit
+                    code_tabs = st.tabs([by_id[fid]["name"] for fid in selected_ids]) if len(selected_ids) > 1 else [st.container()]
+                    for fid, tab in zip(selected_ids, code_tabs):
+                        with tab:
+                            st.text_area(
+                                "Function Code", height=300,
+                                value=DEFAULT_CODE.get(by_id[fid]["language"], ""), key=f"code_{fid}"
+                            )
                     
-                    if st.button("Execute Function"):
-                        with st.spinner("Executing function..."):
-                            try:
-                                data = {"code": code}
-                                response = requests.post(
-                                    f"{API_BASE_URL}/execute/{selected_function_id}?mode={execution_mode}", 
-                                    json=data
-                                )
-                                
-                                if response.status_code == 200:
-                                    result = response.json()
-                                    
-                                    st.success("Function executed successfully!")
-                                    
-                                    # Display execution results in tabs
-                                    output_tab, metrics_tab = st.tabs(["Output", "Execution Metrics"])
-                                    
-                                    with output_tab:
-                                        st.subheader("Function Output")
-                                        logs = result.get("logs", "")
-                                        if logs:
-                                            st.text_area("Logs", value=logs, height=200, disabled=True)
-                                        else:
-                                            st.info("No output from function.")
-                                    
-                                    with metrics_tab:
-                                        st.subheader("Execution Metrics")
-                                        col1, col2, col3 = st.columns(3)
-                                        
-                                        with col1:
-                                            st.metric("Execution Time", f"{result.get('execution_time', 0):.4f} sec")
-                                        
-                                        with col2:
-                                            cpu = result.get('cpu_usage', 0)
-                                            # Format CPU usage to be more readable
-                                            if cpu > 1_000_000_000:
-                                                cpu_display = f"{cpu / 1_000_000_000:.2f} Gcycles"
-                                            else:
-                                                cpu_display = f"{cpu / 1_000_000:.2f} Mcycles"
-                                            st.metric("CPU Usage", cpu_display)
-                                        
-                                        with col3:
-                                            memory = result.get('memory_usage', 0)
-                                            # Format memory to be more readable
-                                            if memory > 1_000_000:
-                                                memory_display = f"{memory / 1_000_000:.2f} MB"
-                                            else:
-                                                memory_display = f"{memory / 1_000:.2f} KB"
-                                            st.metric("Memory Usage", memory_display)
-                                        
-                                        st.metric("Exit Code", result.get('exit_code', 'N/A'))
-                                        
-                                        if "error" in result:
-                                            st.error(f"Error during execution: {result['error']}")
-                                else:
-                                    st.error(f"Error executing function: {response.text}")
-                            except Exception as e:
-                                st.error(f"Error connecting to backend: {e}")
-            else:
-                st.info("No functions found. Create one in the 'Manage Functions' page.")
+                    submitted = st.form_submit_button("Execute Function" if len(selected_ids) == 1 else "Execute Functions")
+            
+            if submitted and len(selected_ids) == 1:
+                selected_function_id = selected_ids[0]
+                selected_function = by_id[selected_function_id]
+                
+                with st.spinner("Executing function..."):
+                    try:
+                        data = {"code": st.session_state[f"code_{selected_function_id}"]}
+                        response = get_http().post(
+                            f"{API_BASE_URL}/execute/{selected_function_id}?mode={execution_mode}", 
+                            data=orjson.dumps(data),
+                            headers=STREAM_HEADERS,
+                            timeout=2 * selected_function["timeout"] + REQUEST_TIMEOUT,
+                            stream=True
+                        )
+                        
+                        if response.status_code == 200:
+                            result = read_execution_stream(response, st.empty())
+                            fetch_dashboard.clear()
+                            
+                            if "error" in result:
+                                st.error(f"Error executing function: {result['error']}")
+                            else:
+                                st.success("Function executed successfully!")
+                            
+                            # Display execution results in tabs
+                            _render_result(result, selected_function_id)
+                        else:
+                            st.error(f"Error executing function: {response.text}")
+                    except Exception as e:
+                        st.error(f"Error connecting to backend: {e}")
+            elif submitted:
+                with st.spinner(f"Executing {len(selected_ids)} functions..."):
+                    try:
+                        data = {"executions": [
+                            {"function_id": fid, "code": st.session_state[f"code_{fid}"], "mode": execution_mode}
+                            for fid in selected_ids
+                        ]}
+                        # The batch runs concurrently, so it takes as long as its slowest function
+                        response = get_http().post(
+                            f"{API_BASE_URL}/execute/batch",
+                            data=orjson.dumps(data),
+                            headers=JSON_HEADERS,
+                            timeout=2 * max(by_id[fid]["timeout"] for fid in selected_ids) + REQUEST_TIMEOUT
+                        )
+                        
+                        if response.status_code == 200:
+                            results = parse_json(response)
+                            fetch_dashboard.clear()
+                            
+                            failed = sum("error" in result for result in results)
+                            if failed:
+                                st.warning(f"{failed} of {len(results)} executions reported an error.")
+                            else:
+                                st.success(f"{len(results)} functions executed successfully!")
+                            
+                            # One tab per function
+                            result_tabs = st.tabs([by_id[result["function_id"]]["name"] for result in results])
+                            for result, tab in zip(results, result_tabs):
+                                with tab:
+                                    _render_result(result, f"batch_{result['function_id']}")
+                        else:
+                            st.error(f"Error executing functions: {response.text}")
+                    except Exception as e:
+                        st.error(f"Error connecting to backend: {e}")
         else:
-            st.error(f"Error fetching functions: {response.text}")
+            st.info("No functions found. Create one in the 'Manage Functions' page.")
+    except requests.HTTPError as e:
+        st.error(f"Error fetching functions: {e.response.text}")
     except Exception as e:
         st.error(f"Error connecting to backend: {e}")
 
+# (column, title, unit) of each bar panel on the Metrics page, left to right and top to bottom
+BAR_PANELS = (
+    ("total_executions", "Total Executions", "executions"),
+    ("error_rate", "Error Rate (%)", "%"),
+    ("average_response_time", "Avg Response Time (s)", "s"),
+    ("memory_mb", "Avg Memory Usage (MB)", "MB"),
+)
+BAR_COLORS = px.colors.qualitative.Plotly
+
+@st.cache_data(max_entries=8)
+def metrics_figures(df):
+    """
+    Charts for the Metrics page, rebuilt only when the metrics frame changes.
+    """
+    # Vectorized over the numeric columns; functions without executions get a 0% error rate.
+    errors = df["error_count"].to_numpy(dtype="float64")
+    totals = df["total_executions"].to_numpy(dtype="float64")
+    error_rate = np.divide(errors, totals, out=np.zeros(len(df)), where=totals != 0) * 100
+    # Plotly gets plain NumPy columns; the Arrow-backed frame is for st.dataframe.
+    df = pd.DataFrame({
+        "function_name": df["function_name"].to_numpy(dtype=object),
+        "total_executions": totals,
+        "average_response_time": df["average_response_time"].to_numpy(dtype="float64"),
+        "error_rate": np.round(error_rate, 2),
+        # Convert to MB for readability
+        "memory_mb": np.round(df["average_memory_usage"].to_numpy(dtype="float64") / 1_000_000, 2),
+    })
+    # All four bar charts share one figure, so the page sends a single Plotly payload.
+    bars_fig = make_subplots(rows=2, cols=2, shared_xaxes=True, subplot_titles=[title for _, title, _ in BAR_PANELS])
+    colors = [BAR_COLORS[i % len(BAR_COLORS)] for i in range(len(df))]
+    for i, (column, title, unit) in enumerate(BAR_PANELS):
+        row, col = divmod(i, 2)
+        bars_fig.add_trace(
+            go.Bar(
+                x=df["function_name"], y=df[column], name=title, marker_color=colors,
+                hovertemplate=f"%{{x}}<br>%{{y}} {unit}<extra></extra>"
+            ),
+            row=row + 1, col=col + 1
+        )
+    bars_fig.update_yaxes(range=[0, 100], row=1, col=2)
+    bars_fig.update_layout(showlegend=False, height=700)
+    comparison_fig = px.scatter(
+        df,
+        x="average_response_time",
+        y="memory_mb",
+        size="total_executions", 
+        color="function_name",
+        hover_name="function_name",
+        size_max=50,
+        labels={
+            "average_response_time": "Avg Response Time (s)",
+            "memory_mb": "Avg Memory Usage (MB)",
+            "function_name": "Function"
+        }
+    )
+    return bars_fig, comparison_fig
+
 def metrics_page():
     st.title("Function Metrics")
     
     try:
-        # Get metrics data
-        metrics_response = requests.get(f"{API_BASE_URL}/metrics/")
-        functions_response = requests.get(f"{API_BASE_URL}/functions/")
+        # Get metrics data and function names in a single round trip
+        dashboard = fetch_dashboard()
+        functions = dashboard["/functions/"]
+        metrics = dashboard["/metrics/"]
+        
+        # Create a lookup dictionary for function names
+        function_names = {f["id"]: f["name"] for f in functions}
         
-        if metrics_response.status_code == 200 and functions_response.status_code == 200:
-            metrics = metrics_response.json()
-            functions = functions_response.json()
+        if metrics:
+            # Add function names to metrics data
+            for metric in metrics:
+                metric["function_name"] = function_names.get(metric["function_id"], f"Unknown (ID: {metric['function_id']})")
             
-            # Create a lookup dictionary for function names
-            function_names = {f["id"]: f["name"] for f in functions}
+            # Convert to DataFrame for easier manipulation
+            df = pd.DataFrame.from_records(metrics, columns=METRICS_COLUMNS).astype(METRICS_DTYPES)
+            
+            st.subheader("Overall Function Metrics")
+            st.dataframe(df)
+            
+            # Create visualizations
+            bars_fig, comparison_fig = metrics_figures(df)
+            st.plotly_chart(bars_fig, use_container_width=True)
+            
+            # Resource comparison
+            st.subheader("Resource Comparison")
+            st.plotly_chart(comparison_fig, use_container_width=True)
             
-            if metrics:
-                # Add function names to metrics data
-                for metric in metrics:
-                    metric["function_name"] = function_names.get(metric["function_id"], f"Unknown (ID: {metric['function_id']})")
-                
-                # Convert to DataFrame for easier manipulation
-                df = pd.DataFrame(metrics)
-                
-                st.subheader("Overall Function Metrics")
-                st.dataframe(df)
-                
-                # Create visualizations
-                col1, col2 = st.columns(2)
-                
-                with col1:
-                    st.subheader("Total Executions")
-                    fig = px.bar(
-                        df, 
-                        x="function_name", 
-                        y="total_executions",
-                        color="function_name",
-                        labels={"function_name": "Function", "total_executions": "Total Executions"}
-                    )
-                    st.plotly_chart(fig, use_container_width=True)
-                    
-                    st.subheader("Error Rate")
-                    df["error_rate"] = (df["error_count"] / df["total_executions"] * 100).round(2)
-                    fig = px.bar(
-                        df, 
-                        x="function_name", 
-                        y="error_rate",
-                        color="function_name",
-                        labels={"function_name": "Function", "error_rate": "Error Rate (%)"}
-                    )
-                    fig.update_layout(yaxis_range=[0, 100])
-                    st.plotly_chart(fig, use_container_width=True)
-                
-                with col2:
-                    st.subheader("Average Response Time")
-                    fig = px.bar(
-                        df, 
-                        x="function_name", 
-                        y="average_response_time",
-                        color="function_name",
-                        labels={"function_name": "Function", "average_response_time": "Avg Response Time (s)"}
-                    )
-                    st.plotly_chart(fig, use_container_width=True)
-                    
-                    st.subheader("Average Memory Usage")
-                    # Convert to MB for readability
-                    df["memory_mb"] = (df["average_memory_usage"] / 1_000_000).round(2)
-                    fig = px.bar(
-                        df, 
-                        x="function_name", 
-                        y="memory_mb",
-                        color="function_name",
-                        labels={"function_name": "Function", "memory_mb": "Avg Memory Usage (MB)"}
-                    )
-                    st.plotly_chart(fig, use_container_width=True)
-                
-                # Resource comparison
-                st.subheader("Resource Comparison")
-                fig = px.scatter(
-                    df,
-                    x="average_response_time",
-                    y="memory_mb",
-                    size="total_executions", 
-                    color="function_name",
-                    hover_name="function_name",
-                    size_max=50,
-                    labels={
-                        "average_response_time": "Avg Response Time (s)",
-                        "memory_mb": "Avg Memory Usage (MB)",
-                        "function_name": "Function"
-                    }
-                )
-                st.plotly_chart(fig, use_container_width=True)
-                
-            else:
-                st.info("No metrics data available yet. Execute some functions to generate metrics.")
         else:
-            st.error("Failed to fetch metrics or functions data.")
+            st.info("No metrics data available yet. Execute some functions to generate metrics.")
+    except requests.HTTPError as e:
+        st.error(f"Failed to fetch metrics or functions data: {e.response.text}")
     except Exception as e:
         st.error(f"Error connecting to backend: {e}")
 